@@ -33,10 +33,13 @@ def main():
     setup_group = OptionGroup(parser, "Exploration Setup")
     setup_group.add_option("-s", "--start", dest="entry", action="store", help="Specify entry point", default="")
     setup_group.add_option("--cvc", dest="solver", action="store_const", const="cvc", help="Use the CVC SMT solver instead of Z3")
-    # setup_group.add_option("--z3str2", dest="solver", action="store_const", const="z3str2", help="Use the Z3-str2 SMT solver instead of Z3")
-    # setup_group.add_option("--z3", dest="solver", action="store_const", const="z3", help="Use the Z3 SMT solver")
-    # setup_group.add_option("--multi", dest="solver", action="store_const", const="multi", help="Use as many different solvers as possible simultaneously")
-    # setup_group.add_option("--os", dest="solver", help="Use as many different solvers as possible simultaneously")
+    setup_group.add_option("--z3str2", dest="solver", action="store_const", const="z3str2", help="Use the Z3-str2 SMT solver instead of Z3")
+    setup_group.add_option("--z3", dest="solver", action="store_const", const="z3", help="Use the Z3 SMT solver")
+    setup_group.add_option("--multi", dest="solver", action="store_const", const="multi", help="Use as many different solvers as possible simultaneously")
+    setup_group.add_option("--portfolio", dest="portfolio", action="append", type="str",
+                           help="Race each query on this solver, repeat for every solver of the portfolio "
+                                "(z3, cvc, z3str2, optionally tuned, e.g. z3:use_lia=false or cvc:rewrite-divk=false)",
+                           default=None)
     parser.add_option_group(setup_group)
 
     # Configuration
@@ -47,6 +50,55 @@ def main():
     configuration_group.add_option("-p", "--scheduling-policy", dest="scheduling_policy", type="str",
                                    help="The name of the scheduling policy used to assign solving jobs to solvers.",
                                    default="central_queue")
+    configuration_group.add_option("--search-strategy", dest="search_strategy", type="str",
+                                   help="The name of the search strategy ordering the constraints to solve "
+                                        "(depth_first, generational, coverage_novelty, shortest_job_first)",
+                                   default="depth_first")
+    configuration_group.add_option("--frontier-order", dest="frontier_order", type="choice",
+                                   choices=["depth_first", "breadth_first", "random_path", "shortest_first"],
+                                   help="The order of the constraints the search strategy ranks the same "
+                                        "(depth_first, breadth_first, random_path, shortest_first)",
+                                   default="depth_first")
+    configuration_group.add_option("--adaptive-timeouts", dest="adaptive_timeouts", action="store_true",
+                                   help="Pick the solve timeouts of a query from the solve times observed at its "
+                                        "branch and for similar queries",
+                                   default=False)
+    configuration_group.add_option("--loop-summaries", dest="loop_summaries", action="store_true",
+                                   help="Replace the iterations of counted loops in queries by a summary with a "
+                                        "symbolic trip count",
+                                   default=False)
+    configuration_group.add_option("--merge-states", dest="merge_states", action="store_true",
+                                   help="Compute both arms of small if statements that only assign variables and "
+                                        "merge them into if-then-else expressions instead of forking",
+                                   default=False)
+    configuration_group.add_option("--function-summaries", dest="function_summaries", action="store_true",
+                                   help="Summarize the paths of the functions called by the entry point and reuse "
+                                        "the summaries instead of exploring the functions again in every caller path. "
+                                        "The calls answered by a summary do not run, so their lines are not covered: "
+                                        "do not combine with -b, which would prune the paths through them",
+                                   default=False)
+    configuration_group.add_option("-e", "--executors", dest="executors", type="int",
+                                   help="Run specified number of concrete executions in parallel "
+                                        "(0 executes in the main process)",
+                                   default=0)
+    configuration_group.add_option("--query-cache-size", dest="query_cache_size", type="int",
+                                   help="Number of solved queries remembered to answer repeated queries without "
+                                        "a solver (0, the default, disables the cache)",
+                                   default=0)
+    configuration_group.add_option("--model-reuse", dest="model_reuse", type="int",
+                                   help="Number of recent inputs and models tried on a query before it is sent to "
+                                        "a solver (0, the default, disables model reuse)",
+                                   default=0)
+    configuration_group.add_option("--unsat-cores", dest="unsat_cores", action="store_true",
+                                   help="Learn the unsat cores of UNSAT answers and answer the queries that contain "
+                                        "one without a solver",
+                                   default=False)
+    configuration_group.add_option("--incremental", dest="incremental", action="store_true",
+                                   help="Keep the path prefix asserted in the solvers and only add what differs "
+                                        "from the previous query of the worker",
+                                   default=False)
+    configuration_group.add_option("--solver-cache", dest="solver_cache", type="str",
+                                   help="The sqlite file that keeps solver answers across runs", default=None)
     parser.add_option_group(configuration_group)
 
     # Input Detection
@@ -67,6 +119,13 @@ def main():
     limits_group.add_option("-b", "--coverage-pruning", dest="coverage_pruning", type="int",
                             help="Prune paths after no coverage increase for the specified number of inputs generated.",
                             default=None)
+    limits_group.add_option("--max-site-constraints", dest="max_site_constraints", type="int",
+                            help="Maximum number of constraints solved per branch site", default=None)
+    limits_group.add_option("--max-site-solve-time", dest="max_site_solve_time", type=float,
+                            help="Maximum solving time in seconds spent per branch site", default=None)
+    limits_group.add_option("--max-unroll", dest="max_unroll", type="int",
+                            help="Maximum number of times a branch site is taken on a path that is solved further "
+                                 "(bounds loop unrolling)", default=None)
     limits_group.add_option("-m", "--max-iters", dest="max_iters", type="int", help="Run specified number of iterations",
                             default=0)
     parser.add_option_group(limits_group)
@@ -110,7 +169,8 @@ def main():
     filename = os.path.abspath(args[0])
 
     # Get the object describing the application
-    app = loaderFactory(filename, options.entry, loader=options.loader)
+    app = loaderFactory(filename, options.entry, loader=options.loader, merge_states=options.merge_states,
+                        function_summaries=options.function_summaries)
     if app is None:
         sys.exit(1)
 
@@ -118,10 +178,23 @@ def main():
 
     engine = ExplorationEngine(app.createInvocation(), solver=solver, query_store=query_store, solvetimeouts=solvetimeouts,
                                workers=options.workers, scheduling_policy=scheduling_policy,
-                               pathtimeout=options.pathtimeout, coverage_pruning=options.coverage_pruning)
+                               pathtimeout=options.pathtimeout, coverage_pruning=options.coverage_pruning,
+                               executors=options.executors, portfolio=options.portfolio,
+                               query_cache_size=options.query_cache_size, solver_cache=options.solver_cache,
+                               incremental=options.incremental, model_reuse=options.model_reuse,
+                               unsat_cores=options.unsat_cores,
+                               search_strategy=options.search_strategy,
+                               adaptive_timeouts=options.adaptive_timeouts,
+                               max_site_constraints=options.max_site_constraints,
+                               max_site_solve_time=options.max_site_solve_time, max_unroll=options.max_unroll,
+                               loop_summaries=options.loop_summaries, frontier_order=options.frontier_order)
     generatedInputs, return_values, path = engine.explore(options.max_iters, options.explorationtimeout)
     # check the result
-    result = app.execution_complete(return_values)
+    # with parallel solvers or executions, the order of the return values varies from run to run
+    orders = None
+    if len(engine.worker_pool) == 1 and options.executors <= 1:
+        orders = options.search_strategy, options.frontier_order
+    result = app.execution_complete(return_values, engine.counters(), orders)
     endtime_cpu = time.process_time()
     endtime_wall = time.time()
     print("Execution time: {0:.2f} seconds".format(endtime_wall - starttime_wall))
@@ -132,6 +205,27 @@ def main():
     total_lines, executed_lines, executed_branches = engine.coverage_statistics()
     print("Line coverage: {}/{} lines ({:.2%})".format(executed_lines, total_lines, (executed_lines/total_lines) if total_lines > 0 else 0))
     print("Branch coverage: {} branches".format(executed_branches))
+    if options.query_cache_size > 0 or options.solver_cache is not None:
+        print("Query cache: {} hits ({} from the solver cache), {} misses".format(
+            engine.query_cache.hits, engine.query_cache.store_hits, engine.query_cache.misses))
+    if engine.reuse_candidates is not None:
+        print("Reused models: {} queries".format(engine.reused_models))
+    if engine.unsat_cores is not None:
+        print("Unsat cores: {} learned, {} queries pruned".format(len(engine.unsat_cores), engine.core_hits))
+    if engine.loop_summaries:
+        print("Loop summaries: {} queries".format(engine.summarized_queries))
+    if app.function_summaries is not None:
+        print("Function summaries: {} recorded, {} calls answered".format(app.function_summaries.recorded,
+                                                                          app.function_summaries.hits))
+    if len(engine.solver_wins) > 1:
+        print("Solver wins: {}".format(", ".join("{}: {}".format(solver, wins) for solver, wins in engine.solver_wins.items())))
+    if len(engine.budget_skips) > 0:
+        print("Branch site budgets: {} constraints skipped".format(
+            sum(sum(skips.values()) for skips in engine.budget_skips.values())))
+        for site, skips in sorted(engine.budget_skips.items(), key=lambda item: str(item[0])):
+            print("  {}: {} constraints, {:.2f} solver seconds, skipped {}".format(
+                site, engine.site_constraints.get(site, 0), engine.site_solve_time.get(site, 0),
+                ", ".join("{} for {}".format(count, budget) for budget, count in sorted(skips.items()))))
     print("Exceptions: {} exceptions raised".format(len({e for e in return_values if
                                                          isinstance(e, Exception) and hasattr(e, 'id')})))
     print("Triaged exceptions: {} triaged exceptions raised".format(len({e.id for e in return_values if
@@ -2,7 +2,9 @@
 import os
 import re
 import sys
+import sqlite3
 import subprocess
+import tempfile
 from optparse import OptionParser
 from sys import platform as _platform
 
@@ -37,6 +39,48 @@ parser.add_option("-n", "--workers", dest="workers", type="int", help="Run speci
 parser.add_option("-p", "--scheduling-policy", dest="scheduling_policy", type="str",
                   help="The name of the scheduling policy used to assign solving jobs to solvers.",
                   default="central_queue")
+parser.add_option("-e", "--executors", dest="executors", type="int",
+                  help="Run the concrete executions of every test in this number of executor processes.", default=0)
+parser.add_option("--portfolio", dest="portfolio", action="append", type="str",
+                  help="Race every query on this solver, repeat for every solver of the portfolio "
+                       "(e.g. --portfolio z3 --portfolio z3:use_lia=false).", default=None)
+parser.add_option("--query-cache-size", dest="query_cache_size", type="int",
+                  help="Run every test with a query cache of this number of queries (0 disables the cache).",
+                  default=None)
+parser.add_option("--model-reuse", dest="model_reuse", type="int",
+                  help="Run every test trying this number of recent inputs and models on a query before a solver "
+                       "(0 disables model reuse).", default=None)
+parser.add_option("--unsat-cores", dest="unsat_cores", action="store_true",
+                  help="Run every test with unsat cores learned and used to prune queries.", default=False)
+parser.add_option("--incremental", dest="incremental", action="store_true",
+                  help="Run every test with the path prefixes kept asserted in the solvers (incremental solvers can "
+                       "return other models, which changes the paths of fp.py, whose int() concretizes).",
+                  default=False)
+parser.add_option("--search-strategy", dest="search_strategy", type="str",
+                  help="Run every test with this search strategy ordering the constraints to solve.", default=None)
+parser.add_option("--frontier-order", dest="frontier_order", type="str",
+                  help="Run every test with this order of the constraints the search strategy ranks the same.",
+                  default=None)
+parser.add_option("--adaptive-timeouts", dest="adaptive_timeouts", action="store_true",
+                  help="Run every test with the solve timeouts picked from the solve times observed.", default=False)
+parser.add_option("--max-site-constraints", dest="max_site_constraints", type="int",
+                  help="Run every test solving at most this number of constraints per branch site (small budgets "
+                       "fail the tests that need more).", default=None)
+parser.add_option("--max-unroll", dest="max_unroll", type="int",
+                  help="Run every test solving further only the paths that take a branch site at most this number "
+                       "of times (small bounds fail the tests that need more).", default=None)
+parser.add_option("--loop-summaries", dest="loop_summaries", action="store_true",
+                  help="Run every test with counted loops summarized by a symbolic trip count.", default=False)
+parser.add_option("--merge-states", dest="merge_states", action="store_true",
+                  help="Run every test with small if statements merged instead of forked.", default=False)
+parser.add_option("--function-summaries", dest="function_summaries", action="store_true",
+                  help="Run every test with the calls of pure functions answered by summaries, without coverage "
+                       "pruning: it cannot see the lines of the calls answered by summaries (loop_summary.py, which "
+                       "needs either pruning or --loop-summaries to leave its loop, fails).", default=False)
+parser.add_option("--solver-cache", dest="solver_cache", action="store_true",
+                  help="Run every test twice on a new solver cache, with different hash seeds; the second run must "
+                       "find every answer of the first in the cache.",
+                  default=False)
 (options, args) = parser.parse_args()
 
 if len(args) == 0 or not os.path.exists(args[0]):
@@ -51,17 +95,80 @@ if not os.path.isdir(test_dir):
 
 files = [f for f in os.listdir(test_dir) if re.search(".py$", f)]
 
+# the options of the exploration modes, passed to pyexz3 for every test
+mode_args = []
+if options.executors > 0:
+    mode_args += ["-e", str(options.executors)]
+for solver in options.portfolio or []:
+    mode_args += ["--portfolio", solver]
+if options.query_cache_size is not None:
+    mode_args += ["--query-cache-size", str(options.query_cache_size)]
+if options.model_reuse is not None:
+    mode_args += ["--model-reuse", str(options.model_reuse)]
+if options.unsat_cores:
+    mode_args.append("--unsat-cores")
+if options.incremental:
+    mode_args.append("--incremental")
+if options.search_strategy is not None:
+    mode_args += ["--search-strategy", options.search_strategy]
+if options.frontier_order is not None:
+    mode_args += ["--frontier-order", options.frontier_order]
+if options.adaptive_timeouts:
+    mode_args.append("--adaptive-timeouts")
+if options.max_site_constraints is not None:
+    mode_args += ["--max-site-constraints", str(options.max_site_constraints)]
+if options.max_unroll is not None:
+    mode_args += ["--max-unroll", str(options.max_unroll)]
+if options.loop_summaries:
+    mode_args.append("--loop-summaries")
+if options.merge_states:
+    mode_args.append("--merge-states")
+if options.function_summaries:
+    mode_args.append("--function-summaries")
+coverage_pruning = [] if options.function_summaries else ["-b 4"]
+
+# tests whose executions share state outside the process (files), which parallel executions interleave
+SERIAL_TESTS = {"filesys.py"}
+
+
+def run_cached(testargs, cache):
+    """Runs the test twice on the same new solver cache under two hash seeds, each time in a new empty working
+    directory. The cache keys must not depend on the hash seed, so the second run must find every query the first
+    run solved and store no new answer."""
+    if os.path.exists(cache):
+        os.remove(cache)
+    testargs = [testargs[0], os.path.abspath(testargs[1])] + testargs[2:-1] + ["--solver-cache", cache, testargs[-1]]
+    stored = []
+    for seed in ("1", "2"):
+        with open(os.devnull, 'w') as devnull, tempfile.TemporaryDirectory() as cwd:
+            ret = subprocess.call(testargs, stdout=devnull, cwd=cwd, env=dict(os.environ, PYTHONHASHSEED=seed))
+        if ret != 0:
+            return ret
+        db = sqlite3.connect(cache)
+        stored.append(db.execute("SELECT COUNT(*) FROM queries").fetchone()[0])
+        db.close()
+    os.remove(cache)
+    return 0 if stored[0] == stored[1] else 1
+
+
 failed = []
 for f in files:
+    if options.executors > 1 and f in SERIAL_TESTS:
+        myprint(bcolors.WARNING, "-", "Test " + f + " skipped, its executions cannot run in parallel.")
+        continue
     # execute the python runner for this test
     full = os.path.join(test_dir, f)
     with open(os.devnull, 'w') as devnull:
         solver = options.solver if options.solver is not None else "--z3"
-        testargs = [sys.executable, "pyexz3.py", "-m 25", "-b 4", "-n", str(options.workers), "-p", options.scheduling_policy, solver]
+        testargs = [sys.executable, "pyexz3.py", "-m 25"] + coverage_pruning + ["-n", str(options.workers), "-p", options.scheduling_policy, solver]
+        testargs += mode_args
         if options.loader is not None:
             testargs.append(options.loader)
         testargs.append(full)
-        ret = subprocess.call(testargs, stdout=devnull)
+        if options.solver_cache:
+            ret = run_cached(testargs, os.path.join(tempfile.gettempdir(), f + ".cache.db"))
+        else:
+            ret = subprocess.call(testargs, stdout=devnull)
     if ret == 0:
         myprint(bcolors.SUCCESS, "✓", "Test " + f + " passed.")
     else:
@@ -0,0 +1,81 @@
+# Copyright: see copyright.txt
+
+import sys
+
+BRANCH_KEYWORDS = ("pyexz3.py", "symbolic", "pydev", "coverage")
+EXIT_KEYWORDS = ("pyexz3.py", "symbolic", "multiprocessing")
+
+_instrumentation = {}  # {(filename, keywords): whether the file is instrumentation}
+_ids = {}  # {(filename, line, branch): BranchId}
+_sites = []  # (filename, line, branch) of each BranchId
+
+
+class BranchId(int):
+    """The interned id of a branch site and direction, the "filename:line:branch" of a branch. Ids are small
+    integers for hashing and comparing; the string is built only when printed. Unpickling interns the site again,
+    so the ids of executor processes map to the same ids in the engine."""
+
+    @property
+    def filename(self):
+        return _sites[self][0]
+
+    @property
+    def line(self):
+        return _sites[self][1]
+
+    @property
+    def site(self):
+        """The (filename, line) of the branch, without its direction."""
+        return _sites[self][:2]
+
+    def __str__(self):
+        return "{}:{}:{}".format(*_sites[self])
+
+    __repr__ = __str__
+
+    def __reduce__(self):
+        return branchId, _sites[self]
+
+
+def branchId(filename, line, branch):
+    key = filename, line, branch
+    ret = _ids.get(key)
+    if ret is None:
+        ret = BranchId(len(_sites))
+        _sites.append(key)
+        _ids[key] = ret
+    return ret
+
+
+def isInstrumentation(code, keywords):
+    """Whether the code object belongs to a file whose path contains one of the keywords, cached per file name so
+    that the cache does not keep code objects alive."""
+    filename = code.co_filename
+    key = filename, keywords
+    ret = _instrumentation.get(key)
+    if ret is None:
+        ret = any(keyword in filename for keyword in keywords)
+        _instrumentation[key] = ret
+    return ret
+
+
+def callerBranchId(branch, depth=1):
+    """The BranchId of the innermost frame of the caller's stack outside the instrumentation, None if there is
+    none. depth is the number of frames to skip, the caller's included."""
+    frame = sys._getframe(depth)
+    while frame is not None:
+        if not isInstrumentation(frame.f_code, BRANCH_KEYWORDS):
+            return branchId(frame.f_code.co_filename, frame.f_lineno, branch)
+        frame = frame.f_back
+    return None
+
+
+def exceptionSite(tb):
+    """The "filename:line" of the innermost frame of the traceback outside the instrumentation, None if there is
+    none."""
+    site = None
+    while tb is not None:
+        if not isInstrumentation(tb.tb_frame.f_code, BRANCH_KEYWORDS):
+            site = "{}:{}".format(tb.tb_frame.f_code.co_filename, tb.tb_lineno)
+        tb = tb.tb_next
+    return site
@@ -1,10 +1,12 @@
 # Copyright: see copyright.txt
 
 import logging
-import inspect
 
 import coverage
 
+from .branch_sites import callerBranchId
+from .hardness import queryFeatures
+
 log = logging.getLogger("se.constraint")
 
 
@@ -13,28 +15,42 @@ class Constraint(object):
     """A constraint is a list of predicates leading to some specific
        position in the code."""
 
-    def __init__(self, parent, last_predicate):
+    def __init__(self, parent, last_predicate, branch_id=None):
         self.inputs = None
         self.lines_covered = {} # {filename: frozenset(line_number)}
         self.branches_covered = {} # {filename: frozenset((origin_line_number, destination_line_number))}
         self.solving_time = 0
+        self.generation = None # number of the execution that created the constraint
+        self.coverage_gain = 0 # lines and arcs first covered by that execution
+        # path summaries derived from the parent's by summarize(), see ExplorationEngine.pruned
+        self.model = None # frozenset((name, concrete value))
+        self.code_coverage = frozenset() # {(filename, line_number)}
+        self.branch_coverage = frozenset() # {(filename, origin_line_number, destination_line_number)}
+        self.path_solving_time = parent.path_solving_time if parent is not None else 0
+        self.ancestor_coverage = parent.ancestor_coverage if parent is not None else ()
+        self.ancestor_code_coverage = parent.ancestor_code_coverage if parent is not None else frozenset()
+        self.ancestor_branch_coverage = parent.ancestor_branch_coverage if parent is not None else frozenset()
         self.predicate = last_predicate
+        self.features = queryFeatures(parent.features if parent is not None else None, last_predicate)
         #print("Predicate: " + str(last_predicate))
         self.processed = False
         self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 0  # the length of the path
         self.children = []
+        self.path_ids = None  # frozenset of the ids of the path from the root, see getPathIds
+        self.child_index = {}  # {Predicate.identity(): child}
         self.id = self.__class__.cnt
         self.__class__.cnt += 1
-        branch = self.predicate.result if self.predicate is not None else ""
-        self.branch_id = self._branch_id(inspect.stack(), branch)
-
-    def _branch_id(self, stack, branch):
-        instrumentation_keywords = {"pyexz3.py", "symbolic", "pydev", "coverage"}
-        for frame, filename, linenum, funcname, context, contextline in stack:
-            if any(instrumentation_keyword in filename for instrumentation_keyword in instrumentation_keywords):
-                continue
-            return "{}:{}:{}".format(filename, linenum, branch)
-        return None
+        # {id: Constraint} shared by every node of the tree, see PathToConstraint.find_constraint
+        self.index = parent.index if parent is not None else {self.id: self}
+        if branch_id is None:
+            branch = self.predicate.result if self.predicate is not None else ""
+            branch_id = callerBranchId(branch)
+        self.branch_id = branch_id  # a BranchId, see branch_sites.py
+        # {BranchId: constraints of the path taken at that site}, and the count of the site of this constraint
+        self.site_depths = dict(parent.site_depths) if parent is not None else {}
+        self.unroll_depth = self.site_depths.get(branch_id, 0) + 1
+        self.site_depths[branch_id] = self.unroll_depth
 
     def __eq__(self, other):
         """Two Constraints are equal iff they have the same chain of predicates"""
@@ -45,10 +61,45 @@ class Constraint(object):
         else:
             return False
 
+    def __getstate__(self):
+        # the index is rebuilt by PathToConstraint when a graph is unpickled
+        return {k: v for k, v in self.__dict__.items() if k != "index"}
+
     def set_coverage(self, cov: coverage.CoverageData):
         for file in cov.measured_files():
             self.lines_covered[file] = frozenset(cov.lines(file))
             self.branches_covered[file] = frozenset(cov.arcs(file))
+        self.code_coverage = frozenset((file, line) for file, lines in self.lines_covered.items() for line in lines)
+        self.branch_coverage = frozenset((file, origin, destination) for file, arcs in self.branches_covered.items()
+                                         for origin, destination in arcs)
+
+    def summarize(self, coverage_depth):
+        """Computes the path summaries once the inputs, coverage and solving time of the node are known.
+
+        path_solving_time adds the solving time of each execution along the path once, and ancestor_coverage
+        holds the coverage of the parents of the last coverage_depth nodes along the path whose inputs differ
+        from their parent's, along with its union."""
+        self.model = None if self.inputs is None else \
+            frozenset((name, value.getConcrValue() if hasattr(value, "getConcrValue") else value)
+                      for name, value in self.inputs.items())
+        parent = self.parent
+        if parent is None:
+            self.path_solving_time = self.solving_time
+            return
+        if self.model != parent.model:
+            self.path_solving_time = parent.path_solving_time + self.solving_time
+        else:
+            self.path_solving_time = parent.path_solving_time
+        if self.model is not None and parent.model is not None and self.model != parent.model \
+                and coverage_depth is not None and coverage_depth > 0:
+            self.ancestor_coverage = ((parent.code_coverage, parent.branch_coverage),) + \
+                                     parent.ancestor_coverage[:coverage_depth - 1]
+            self.ancestor_code_coverage = frozenset().union(*(code for code, _ in self.ancestor_coverage))
+            self.ancestor_branch_coverage = frozenset().union(*(branch for _, branch in self.ancestor_coverage))
+        else:
+            self.ancestor_coverage = parent.ancestor_coverage
+            self.ancestor_code_coverage = parent.ancestor_code_coverage
+            self.ancestor_branch_coverage = parent.ancestor_branch_coverage
 
     def getAssertsAndQuery(self):
         self.processed = True
@@ -63,9 +114,18 @@ class Constraint(object):
         return asserts, self.predicate
 
     def getLength(self):
-        if self.parent is None:
-            return 0
-        return 1 + self.parent.getLength()
+        return self.depth
+
+    def getPathIds(self):
+        """The ids of the constraints from the root to this one, computed once."""
+        if self.path_ids is None:
+            ids = []
+            node = self
+            while node is not None:
+                ids.append(node.id)
+                node = node.parent
+            self.path_ids = frozenset(ids)
+        return self.path_ids
 
     def __str__(self):
         return str(self.predicate) + "  (processed: %s, path_len: %d)" % (self.processed, self.getLength())
@@ -77,16 +137,15 @@ class Constraint(object):
         return s
 
     def findChild(self, predicate):
-        for c in self.children:
-            if predicate == c.predicate:
-                return c
-        return None
+        return self.child_index.get(predicate.identity())
 
-    def addChild(self, predicate):
+    def addChild(self, predicate, branch_id=None):
         assert (self.findChild(predicate) is None)
-        c = Constraint(self, predicate)
+        c = Constraint(self, predicate, branch_id)
         self.children.append(c)
+        self.child_index[predicate.identity()] = c
+        self.index[c.id] = c
         return c
 
     def __lt__(self, other):
-        return self.getLength() > other.getLength()
+        return self.depth > other.depth
@@ -1,9 +1,11 @@
+import functools
 import logging
 
 from symbolic.cvc_expr.integer import CVCInteger
 from symbolic.cvc_expr.string import CVCString
 from symbolic.symbolic_types import SymbolicInteger, SymbolicStr
 from symbolic.symbolic_types.symbolic_type import SymbolicObject
+from symbolic.symbolic_types.term import Term
 import utils
 
 log = logging.getLogger("se.cvc_expr.exprbuilder")
@@ -15,7 +17,18 @@ class ExprBuilder(object):
         self.solver.guards = []
         self.em = self.solver.getExprManager()
         self.cvc_vars = {}
-        self.query = self._toCVC(asserts, query)
+        self.cvc_terms = {}  # {Term: translation} for one translation, whose guards its subterms added
+        self.query = None if query is None else self._toCVC(asserts, query)
+
+    def toCVC(self, pred):
+        """Translates a single predicate together with the guards it needs, for incremental solving; the
+        variables are shared with the earlier translations of the builder."""
+        self.solver.guards = []
+        self.cvc_terms = {}
+        expr = self._predToCVC(pred)
+        for guard in self.solver.guards:
+            expr &= guard
+        return expr
 
     def _toCVC(self, asserts, query):
         smt_query = self._predToCVC(query).not_op()
@@ -56,6 +69,13 @@ class ExprBuilder(object):
             return expr
 
     def _astToCVCExpr(self, expr, env=None):
+        if env is None and isinstance(expr, Term) and expr.interned:
+            if expr not in self.cvc_terms:
+                self.cvc_terms[expr] = self._termToCVCExpr(expr, env)
+            return self.cvc_terms[expr]
+        return self._termToCVCExpr(expr, env)
+
+    def _termToCVCExpr(self, expr, env):
         if isinstance(expr, list):
             op = expr[0]
             args = [self._astToCVCExpr(a, env) for a in expr[1:]]
@@ -75,6 +95,19 @@ class ExprBuilder(object):
             elif op == "%":
                 return cvc_l % cvc_r
 
+            # merged states (see state_merging.py)
+            elif op == "ite":
+                if env is None:
+                    return (cvc_l != CVCInteger.constant(0, self.solver)).ite(cvc_r, cvc_3)
+                else:
+                    return cvc_r if cvc_l else cvc_3
+            elif op == "and":
+                if env is None:
+                    return self._wrapIf(functools.reduce(lambda x, y: x & y, [a != CVCInteger.constant(0, self.solver)
+                                                                            for a in args]), env)
+                else:
+                    return all(args)
+
             # bitwise
             elif op == "<<":
                 return cvc_l << cvc_r
@@ -8,6 +8,8 @@ from string import Template
 from CVC4 import ExprManager, SmtEngine, SExpr
 
 from symbolic.cvc_expr.exprbuilder import ExprBuilder
+from symbolic.predicate import Predicate
+from symbolic.solver_session import SolverSession
 
 from symbolic.cvc_expr.integer import CVCInteger
 from symbolic.cvc_expr.string import CVCString
@@ -33,21 +35,36 @@ class CVCWrapper(object):
         self.solver_type = solver_type
         self.query_store = query_store
         self.smtlib = None
+        self.options = dict(CVCWrapper.options)  # per instance, tuned portfolio entries change them
+        # keep the path predicates asserted across queries, see SolverSession
+        self.incremental = False
+        self.session = None
+        self.exprbuilder = None
+        self.produce_cores = False  # read unsat cores, only in incremental mode
+        self.tracked = {}  # {asserted formula as string: Predicate}, to read unsat cores
+        # the asserts and negated query that made the last query UNSAT
+        self.unsat_core = None
+        self.interrupted = False
+
+    def interrupt(self):
+        """Stops the current query, which then returns UNKNOWN. Called from another thread of the process."""
+        self.interrupted = True
+        if self.solver is not None:
+            self.solver.interrupt()
 
     def findCounterexample(self, asserts, query, timeout=None):
         """Tries to find a counterexample to the query while
            asserts remains valid."""
         startime = time.process_time()
-        self.em = ExprManager()
-        self.solver = SmtEngine(self.em)
-        if timeout is not None:
-            self.options['tlimit-per'] = timeout*1000
-        for name, value in CVCWrapper.options.items():
-            self.solver.setOption(name, SExpr(str(value)))
-        self.solver.setLogic(CVCWrapper.logic)
         self.query = query
         self.asserts = asserts
-        result, model = self._findModel()
+        self.unsat_core = None
+        # serialized queries need the whole formula
+        if self.incremental and self.query_store is None:
+            result, model = self._findModelIncremental(timeout)
+        else:
+            self._newSolver(timeout)
+            result, model = self._findModel()
         endtime = time.process_time()
         log.debug("Timeout -- %s" % timeout)
         log.debug("Result -- %s" % result)
@@ -56,6 +73,74 @@ class CVCWrapper(object):
         solvertime = endtime - startime
         return result, model, solvertime
 
+    def _newSolver(self, timeout):
+        self.em = ExprManager()
+        self.solver = SmtEngine(self.em)
+        if timeout is not None:
+            self.options['tlimit-per'] = timeout*1000
+        for name, value in self.options.items():
+            self.solver.setOption(name, SExpr(str(value)))
+        if self.incremental and self.produce_cores:
+            try:
+                self.solver.setOption('produce-unsat-cores', SExpr('true'))
+            except Exception as e:
+                log.debug("No unsat cores: %s" % e)
+        self.solver.setLogic(CVCWrapper.logic)
+
+    def _findModelIncremental(self, timeout):
+        """_findModel on a solver that keeps the asserts of the previous query. The per query time limit is
+        an option of the solver, so a different timeout starts a new session."""
+        if self.session is None or self.options.get('tlimit-per') != (timeout*1000 if timeout is not None else None):
+            self.options['incremental'] = 'true'
+            self._newSolver(timeout)
+            self.exprbuilder = ExprBuilder([], None, self.solver)
+            self.session = SolverSession(self.solver.push, self._pop, lambda p, level: self._assertTracked(p))
+            self.tracked = {}
+        self.session.assertPrefix(self.asserts)
+        self.solver.push()
+        self._assertTracked(Predicate(self.query.symtype, not self.query.result))
+        variables = set(self.query.getVars()).union(*[a.getVars() for a in self.asserts])
+        model = None
+        try:
+            result = self.solver.checkSat()
+            if self.interrupted:
+                ret = "UNKNOWN"
+            elif not result.isSat():
+                ret = "UNSAT"
+                self.unsat_core = self._unsatCore()
+            elif result.isUnknown():
+                ret = "UNKNOWN"
+            else:
+                ret = "SAT"
+                model = self._getModel({name: var for name, var in self.exprbuilder.cvc_vars.items()
+                                        if name in variables})
+        except (RuntimeError, TypeError) as e:
+            log.debug("CVC exception %s" % e)
+            ret = "UNKNOWN"
+        self.solver.pop()
+        return ret, model
+
+    def _assertTracked(self, predicate):
+        formula = self.exprbuilder.toCVC(predicate).cvc_expr
+        self.tracked[formula.toString()] = predicate
+        self.solver.assertFormula(formula)
+
+    def _unsatCore(self):
+        if not self.produce_cores:
+            return None
+        try:
+            core = [self.tracked.get(formula.toString()) for formula in self.solver.getUnsatCore()]
+        except Exception as e:
+            log.debug("No unsat core: %s" % e)
+            return None
+        if len(core) == 0 or None in core:
+            return None
+        return core
+
+    def _pop(self, levels):
+        for _ in range(levels):
+            self.solver.pop()
+
     def _findModel(self):
         self.solver.push()
         exprbuilder = ExprBuilder(self.asserts, self.query, self.solver)
@@ -76,7 +161,9 @@ class CVCWrapper(object):
         model = None
         try:
             result = self.solver.checkSat()
-            if not result.isSat():
+            if self.interrupted:
+                ret = "UNKNOWN"
+            elif not result.isSat():
                 ret = "UNSAT"
             elif result.isUnknown():
                 ret = "UNKNOWN"
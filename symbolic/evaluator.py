@@ -0,0 +1,52 @@
+# Copyright: see copyright.txt
+
+import operator
+
+from .symbolic_types.symbolic_type import SymbolicType
+
+# the concrete semantics of the operators recorded in symbolic expressions, as computed while the program runs
+OPERATORS = {"+": operator.add,
+             "-": operator.sub,
+             "*": operator.mul,
+             "//": operator.floordiv,
+             "%": operator.mod,
+             "&": operator.and_,
+             "|": operator.or_,
+             "^": operator.xor,
+             "<<": operator.lshift,
+             ">>": operator.rshift,
+             "==": operator.eq,
+             "!=": operator.ne,
+             "<": operator.lt,
+             "<=": operator.le,
+             ">": operator.gt,
+             ">=": operator.ge,
+             "str.len": len,
+             "in": lambda x, y: y in x,
+             "slice": lambda x, y, z: x[y:z],
+             "getitem": lambda x, y: x[y],
+             "str.find": str.find,
+             "str.startswith": str.startswith,
+             "str.replace": str.replace,
+             "ite": lambda c, x, y: x if c else y,
+             "and": lambda *args: all(args)}
+
+
+def evaluate(expr, env):
+    """The concrete value of a symbolic expression for the variable values in env ({name: value}). Raises
+    KeyError for unknown operators or variables missing from env."""
+    if isinstance(expr, list):
+        return OPERATORS[expr[0]](*[evaluate(arg, env) for arg in expr[1:]])
+    elif isinstance(expr, SymbolicType):
+        if expr.isVariable():
+            return env[expr.name]
+        return evaluate(expr.expr, env)
+    return expr
+
+
+def satisfies(predicate, env):
+    """Whether the branch of the predicate is taken for env; False if the predicate cannot be evaluated."""
+    try:
+        return bool(evaluate(predicate.symtype, env)) == predicate.result
+    except Exception:
+        return False
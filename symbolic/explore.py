@@ -3,18 +3,26 @@
 
 import logging
 import time
-import traceback
-from multiprocessing import Process, Queue
+from collections import deque
+from multiprocessing.connection import wait
 from operator import attrgetter
 from os import path
-from queue import PriorityQueue
-from sys import exc_info, platform
 
 import coverage
 
 import symbolic.scheduling_policies
+import symbolic.search_strategies
+from .branch_sites import exceptionSite
+from .evaluator import satisfies
+from .frontier import Frontier
+from .hardness import HardnessModel
+from .loop_summary import summarizeLoops
 from .path_to_constraint import PathToConstraint
+from .predicate import Predicate
+from .query_cache import QueryCache
 from .symbolic_types import symbolic_type, SymbolicType
+from .timeout_ladder import TimeoutLadder
+from .workers import SolverWorker, ExecutorWorker
 #from .z3_wrap import Z3Wrapper
 
 log = logging.getLogger("se.conc")
@@ -22,10 +30,14 @@ log = logging.getLogger("se.conc")
 
 class ExplorationEngine:
     DEFAULT_SOLVE_TIMEOUTS = [0.13, 0.26, 0.52, 1.04, 2.08, 4.16, 8.32, 16.64, 33.28]
-    SLEEP_WAIT = 0.02
+    SOLVERS = ("z3", "cvc", "z3str2")
 
     def __init__(self, funcinv, solver="z3", query_store=None, solvetimeouts=None, pathtimeout=None,
-                 coverage_pruning=None, workers=1, scheduling_policy="central_queue"):
+                 coverage_pruning=None, workers=1, scheduling_policy="central_queue", executors=0, portfolio=None,
+                 query_cache_size=0, solver_cache=None, incremental=False, model_reuse=0, unsat_cores=False,
+                 search_strategy="depth_first", adaptive_timeouts=False, max_site_constraints=None,
+                 max_site_solve_time=None, max_unroll=None, loop_summaries=False,
+                 frontier_order="depth_first"):
         self.invocation = funcinv
         # the input to the function
         self.symbolic_inputs = {}  # string -> SymbolicType
@@ -34,7 +46,6 @@ class ExplorationEngine:
         # initialize
         for n in funcinv.getNames():
             self.symbolic_inputs[n] = funcinv.createArgumentValue(n)
-        self.constraints_to_solve = PriorityQueue()
         self.new_constraints = []
         self.num_processed_constraints = 0
         self.path = PathToConstraint(lambda c: self.addConstraint(c), funcinv.name)
@@ -44,82 +55,121 @@ class ExplorationEngine:
         if solvetimeouts is None:
             solvetimeouts = ExplorationEngine.DEFAULT_SOLVE_TIMEOUTS
         self.solvetimeouts = sorted(set(solvetimeouts))
+        self.timeout_ladder = TimeoutLadder(self.solvetimeouts, adaptive_timeouts)
+        self.hardness = HardnessModel()  # predicted solve times, passed to the scheduling policies
         self.pathtimeout = pathtimeout
         self.coverage_pruning = coverage_pruning
+        # budgets per branch site (Constraint.branch_id), None for no limit
+        self.max_site_constraints = max_site_constraints
+        self.max_site_solve_time = max_site_solve_time
+        self.max_unroll = max_unroll
+        self.site_constraints = {}  # {branch_id: constraints queued for a solver}
+        self.site_solve_time = {}  # {branch_id: solver seconds spent on the constraints of the site}
+        self.budget_skips = {}  # {branch_id: {exhausted budget: constraints not solved}}
 
         self.solver = solver
+        # every query is raced on all solvers of the portfolio, the first SAT/UNSAT answer wins
+        if portfolio:
+            self.portfolio = list(portfolio)
+        elif solver == "multi":
+            if any(isinstance(value, str) for value in self.symbolic_inputs.values()):
+                self.portfolio = ["cvc", "z3str2"]
+            else:
+                self.portfolio = ["z3", "cvc"]
+        else:
+            self.portfolio = [solver]
+        for backend in self.portfolio:
+            if backend.split(":")[0] not in ExplorationEngine.SOLVERS:
+                raise ValueError("Unknown solver {}".format(backend))
+        if len(self.portfolio) > workers:
+            log.info("Raising the number of solver workers to the {} solvers of the portfolio".format(len(self.portfolio)))
+            workers = len(self.portfolio)
+        self.solver_wins = {backend: 0 for backend in self.portfolio}  # {solver: decisive SAT/UNSAT answers}
         self.total_solve_time = 0
         self.last_solve_time = 0
-
-        self.worker_pool = {i: None for i in range(1, workers + 1)}
-        self.worker_jobs = {i: None for i in range(1, workers + 1)}
-        log.info("Using {} solver workers".format(len(self.worker_pool)))
-        self.finished_queries = Queue()
-
-        self.scheduling_policy = attrgetter(scheduling_policy)(symbolic.scheduling_policies)
+        self.query_cache = QueryCache(query_cache_size, solver_cache)
+        self.query_keys = {}  # {Constraint.id: QueryCache key of the query sent to the solvers}
+        # recent inputs and models ({name: value}) tried on a query before a solver is started
+        self.reuse_candidates = deque(maxlen=model_reuse) if model_reuse > 0 else None
+        self.reused_models = 0
+        # {frozenset of Predicate.key()}, contradictory asserts and negated queries; None without core learning
+        self.unsat_cores = set() if unsat_cores else None
+        self.core_hits = 0
+        self.loop_summaries = loop_summaries
+        self.summarized_queries = 0  # queries whose path had counted loops replaced by a summary
+        self.sliced_queries = 0  # queries whose cone of influence left out some asserts of the path
 
         self.query_store = query_store
         if self.query_store is not None:
             if not path.isdir(self.query_store):
                 raise IOError("Query folder {} not found".format(self.query_store))
 
+        # solver processes are started lazily and live for the whole exploration
+        self.incremental = incremental
+        self.worker_pool = {i: SolverWorker(i, ExplorationEngine._solve, self.query_store, incremental, unsat_cores)
+                            for i in range(1, workers + 1)}
+        self.worker_jobs = {i: None for i in range(1, workers + 1)}  # the view of the pool seen by scheduling policies
+        self.busy_workers = set()  # {worker_id}
+        self.cancelled_workers = set()  # {worker_id} of the busy workers whose answer is no longer needed
+        self.constraint_workers = {}  # {Constraint.id: {worker_id}}
+        self.worker_paths = {}  # {worker_id: the last Constraint solved by the worker, whose path its session holds}
+        self.shared_prefixes = 0  # queries sent to a worker whose session holds a part of their path
+        log.info("Using {} solver workers".format(len(self.worker_pool)))
+        self.finished_queries = deque()
+
+        # with executors, models are executed in worker processes and merged back into the constraint tree
+        self.executor_pool = {i: ExecutorWorker(i, ExplorationEngine._execute, funcinv) for i in range(1, executors + 1)}
+        self.busy_executors = set()  # {executor_id}
+        self.pending_executions = deque()  # (Constraint, inputs, solving_time) waiting for a free executor
+        self.finished_executions = deque()  # ((Constraint, inputs, solving_time), execution result)
+        if executors > 0:
+            log.info("Using {} executor workers".format(len(self.executor_pool)))
+
+        self.scheduling_policy = attrgetter(scheduling_policy)(symbolic.scheduling_policies)
+        self.search_strategy = attrgetter(search_strategy)(symbolic.search_strategies)
+        self.constraints_to_solve = Frontier(self.search_strategy, self, frontier_order,
+                                             getattr(self.scheduling_policy, "per_constraint", False))
+        self.generation = 0  # number of finished executions
+        self.site_hits = {}  # {branch_id: number of constraints created at the branch}
+        self.search_cache = {}  # scratch space of the search strategy
+
         # outputs
         self.solved_constraints = set()
         self.outstanding_constraint_attempts = {}
         self.generated_inputs = []
         self.execution_return_values = []
 
+    def counters(self):
+        """The counters of the features enabled in this exploration, {name: value}, checked by the tests that define
+        expected_counters."""
+        counters = {"sliced_queries": self.sliced_queries}
+        if self.query_cache.size > 0 or self.query_cache.db is not None:
+            counters["query_cache.hits"] = self.query_cache.hits
+        if self.reuse_candidates is not None:
+            counters["reused_models"] = self.reused_models
+        if self.unsat_cores is not None:
+            counters["core_hits"] = self.core_hits
+        if self.incremental:
+            counters["shared_prefixes"] = self.shared_prefixes
+        if self.loop_summaries:
+            counters["summarized_queries"] = self.summarized_queries
+        return counters
+
     def addConstraint(self, constraint):
         self.new_constraints.append(constraint)
 
     def pruned(self, constraint):
-        current_path_time = 0
-        path_inputs = set()
-        c = constraint
-        while c is not None:
-            if self.frozen_model(c.inputs) not in path_inputs:
-                current_path_time += c.solving_time
-            frozen = self.frozen_model(c.inputs)
-            path_inputs.add(frozen)
-            c = c.parent
-        log.debug("Path solve time {}".format(current_path_time))
-
-
-        parent_code_coverage = set()  # {(filename, line)}
-        parent_branch_coverage = set()  # {(filename, arc_origin, arc_dest)}
-        parent_search_depth = self.coverage_pruning if self.coverage_pruning is not None else 0
-        c = constraint
-        while c is not None and parent_search_depth > 0:
-            if c.parent is not None and c.inputs is not None and c.parent.inputs is not None and \
-                            {name: value.getConcrValue() for name, value in c.inputs.items()} != \
-                            {name: value.getConcrValue() for name, value in c.parent.inputs.items()}:
-                parent_search_depth -= 1
-                for filename, lines in c.parent.lines_covered.items():
-                    for line in lines:
-                        parent_code_coverage.add((filename, line))
-                for filename, branches in c.parent.branches_covered.items():
-                    for branch in branches:
-                        arc_origin, arc_dest = branch
-                        parent_branch_coverage.add((filename, arc_origin, arc_dest))
-            c = c.parent
-        node_code_coverage = set()
-        node_branch_coverage = set()
-        for filename, lines in constraint.lines_covered.items():
-                for line in lines:
-                        node_code_coverage.add((filename, line))
-                for filename, branches in constraint.branches_covered.items():
-                    for branch in branches:
-                        arc_origin, arc_dest = branch
-                        node_branch_coverage.add((filename, arc_origin, arc_dest))
-        log.debug("Parent code coverage {}, {}".format(c.inputs if c is not None else c, sorted([line[1] for line in parent_code_coverage])))
-        log.debug("Current code coverage {}, {}".format(constraint.inputs, sorted([line[1] for line in node_code_coverage])))
-        log.debug("Parent branch coverage {}, {}".format(c.inputs if c is not None else c, sorted([branch[1:] for branch in parent_code_coverage])))
-        log.debug("Current branch coverage {}, {}".format(constraint.inputs, sorted([branch[1:] for branch in node_code_coverage])))
-        if (self.pathtimeout is None or current_path_time < self.pathtimeout) and \
+        log.debug("Path solve time {}".format(constraint.path_solving_time))
+        log.debug("Parent code coverage {}".format(sorted(line[1] for line in constraint.ancestor_code_coverage)))
+        log.debug("Current code coverage {}, {}".format(constraint.inputs, sorted(line[1] for line in constraint.code_coverage)))
+        log.debug("Parent branch coverage {}".format(sorted(branch[1:] for branch in constraint.ancestor_branch_coverage)))
+        log.debug("Current branch coverage {}, {}".format(constraint.inputs, sorted(branch[1:] for branch in constraint.branch_coverage)))
+        if (self.pathtimeout is None or constraint.path_solving_time < self.pathtimeout) and \
                 (self.coverage_pruning is None or
-                         parent_search_depth != 0 or (len(parent_code_coverage) + len(parent_branch_coverage) == 0)
-                 or not (parent_code_coverage >= node_code_coverage)
-                 or not (parent_branch_coverage >= node_branch_coverage)):
+                         len(constraint.ancestor_coverage) < self.coverage_pruning
+                 or (len(constraint.ancestor_code_coverage) + len(constraint.ancestor_branch_coverage) == 0)
+                 or not (constraint.ancestor_code_coverage >= constraint.code_coverage)
+                 or not (constraint.ancestor_branch_coverage >= constraint.branch_coverage)):
             return False
         else:
             log.debug("Pruned {}".format(constraint))
@@ -140,47 +190,32 @@ class ExplorationEngine:
                     log.info("Timeout reached, terminating")
                     break
 
-                # Check for finished queries
-                if not self.finished_queries.empty():
-                    log.debug("Processing finished query")
-                    ## Select finished query
-                    selected_id, selected_timeout, result, model, solving_time = self.finished_queries.get_nowait()
-                    if selected_id in self.solved_constraints:
-                        continue
-                    selected = self.path.find_constraint(selected_id) # symbolic.constraint.Constraint
-                elif self.constraints_to_solve.empty() or self._runningSolvers() == len(self.worker_pool):
-                    log.debug("Waiting for solvers to finish")
-                    ## Wait for running queries to finish
-                    self._wait()
+                if len(self.finished_executions) > 0:
+                    log.debug("Merging finished execution")
+                    self._mergeExecution(*self.finished_executions.popleft())
                     continue
-                else:
-                    ## Find constraint with free worker
-                    peeked = []
-                    selected_timeout, selected = None, None
-                    while not self.constraints_to_solve.empty():
-                        peeked_timeout, peeked_constraint = self.constraints_to_solve.get()
-                        candidate_worker = self.scheduling_policy(self.worker_pool, self.solvetimeouts, peeked_timeout)
-                        if candidate_worker is not None:
-                            selected_timeout, selected = peeked_timeout, peeked_constraint
-                            break
-                        else:
-                            peeked.append((peeked_timeout, peeked_constraint))
-
-                    for peeked_timeout, peeked_constraint in peeked:
-                        self.constraints_to_solve.put((peeked_timeout, peeked_constraint))
-
-                    if selected is None:
-                        self._wait()
-                        continue
 
-                    if selected.processed:
-                        continue
+                if len(self.pending_executions) > 0 and len(self.busy_executors) < len(self.executor_pool):
+                    self._launch_executor(*self.pending_executions.popleft())
+                    continue
 
-                    if self.pruned(selected):
+                if len(self.finished_queries) == 0:
+                    ## Hand out queries to free workers, then block until a solver or executor reports back
+                    if self._dispatch():
                         continue
+                    if self._runningSolvers() == 0 and len(self.busy_executors) == 0:
+                        log.warning("No solver worker accepts the queued constraints, terminating")
+                        break
+                    log.debug("Waiting for solvers to finish")
+                    self._wait(None if timeout is None else max(0, starttime + timeout - time.time()))
+                    continue
 
-                    self._launch_worker(selected.id, selected_timeout, selected, self.solver)
+                log.debug("Processing finished query")
+                ## Select finished query
+                selected_id, selected_timeout, result, model, solving_time, solver, core = self.finished_queries.popleft()
+                if selected_id in self.solved_constraints:
                     continue
+                selected = self.path.find_constraint(selected_id) # symbolic.constraint.Constraint
 
                 self.last_solve_time = solving_time
                 self.total_solve_time += self.last_solve_time
@@ -188,126 +223,367 @@ class ExplorationEngine:
                 # Tracking multiple attempts of the same query with different solvers
                 self.outstanding_constraint_attempts[(selected.id, selected_timeout)] -= 1
 
-                if selected.id in self.solved_constraints:
-                    continue
-
                 if selected.branch_id is not None:
-                    log.info("\t".join(["Solver Result", selected.branch_id, result]))
+                    log.info("\t".join(["Solver Result", str(selected.branch_id), solver, result]))
+
+                if core is not None and self.unsat_cores is not None and core not in self.unsat_cores:
+                    log.debug("Learned unsat core of {} predicates".format(len(core)))
+                    self.unsat_cores.add(core)
+
+                if solver in self.solver_wins and result != "CRASH":
+                    self.site_solve_time[selected.branch_id] = \
+                        self.site_solve_time.get(selected.branch_id, 0) + solving_time
+                    self.timeout_ladder.observe(selected, selected_timeout, result, solving_time)
+                    self.hardness.observe(selected.features, selected_timeout, result, solving_time)
+
+                if model is not None or result == "UNSAT":
+                    # first answer wins, the other solvers of the portfolio are cancelled; later answers for a
+                    # decided constraint were skipped above
+                    query_key = self.query_keys.pop(selected.id, None)
+                    if solver in self.solver_wins and selected.id not in self.solved_constraints:
+                        self.solver_wins[solver] += 1
+                        if query_key is not None:
+                            self.query_cache.put(query_key, result, model, solving_time)
+                        if model is not None and self.reuse_candidates is not None:
+                            self.reuse_candidates.append(model)
+                    self._cancel(selected.id)
 
                 if model is None:
-                    if self._running_constraint(selected.id) is not None or self.outstanding_constraint_attempts[(selected.id, selected_timeout)] > 0:
+                    if result != "UNSAT" and (self._running_constraint(selected.id) is not None or
+                                              self.outstanding_constraint_attempts[(selected.id, selected_timeout)] > 0):
                         continue
-                    timeout_index = self.solvetimeouts.index(selected_timeout)
-                    if timeout_index + 1 < len(self.solvetimeouts) and result != "UNSAT":
+                    # a query that killed its worker is given up, a longer timeout would kill the next one too
+                    next_timeout = self.timeout_ladder.next(selected, selected_timeout)
+                    if next_timeout is not None and result not in ("UNSAT", "CRASH") and \
+                            not self._overBudget(selected, requeued=True):
                             selected.processed = False
-                            self.constraints_to_solve.put((self.solvetimeouts[timeout_index + 1], selected))
+                            self._enqueue(next_timeout, selected)
                     else:
-                            from symbolic.predicate import Predicate
                             negated_predicate = Predicate(selected.predicate.symtype, not selected.predicate.result)
                             added_constraint = selected.parent.addChild(negated_predicate)
                             added_constraint.input = None
                             added_constraint.solving_time = solving_time
+                            self.solved_constraints.add(selected.id)
                     continue
                 else:
-                    while self._running_constraint(selected.id) is not None:
-                        worker_id = self._running_constraint(selected.id)
-                        if worker_id is None:
-                            continue
-                        worker = self.worker_pool[worker_id]
-                        worker.terminate()
-                        self.worker_pool[worker_id] = None
-                        self.worker_jobs[worker_id] = None
-
+                    if selected.inputs is not None:
+                        self._setInputs(selected.inputs.copy())
                     for name in model.keys():
-                        self._updateSymbolicParameter(name, model[name])
+                        # loop summaries add trip counts that are not inputs
+                        if name in self.symbolic_inputs:
+                            self._updateSymbolicParameter(name, model[name])
 
-                self._oneExecution(selected)
+                if len(self.executor_pool) > 0:
+                    self.pending_executions.append((selected, self._getInputs(), solving_time))
+                else:
+                    self._oneExecution(selected)
 
                 iterations += 1
                 self.num_processed_constraints += 1
                 self.solved_constraints.add(selected.id)
 
         finally:
-            for worker_id, worker in self.worker_pool.items():
-                if worker is not None:
-                    worker.terminate()
+            for worker in self.worker_pool.values():
+                worker.stop()
+            for executor in self.executor_pool.values():
+                executor.stop()
+            self.query_cache.close()
 
         return self.generated_inputs, self.execution_return_values, self.path
 
     def _running_constraint(self, constraint_id):
-        for worker_id, job_info in self.worker_jobs.items():
-            if job_info is None:
-                continue
-            timeout, constraint = job_info
-            if constraint_id == constraint.id:
-                return worker_id
-        return None
-
-    def _wait(self):
-        while self.finished_queries.empty() and self._runningSolvers() > 0:
-            time.sleep(ExplorationEngine.SLEEP_WAIT)
-            for worker_id, worker in self.worker_pool.items():
-                if worker is not None:
-                    worker.join(ExplorationEngine.SLEEP_WAIT)
+        workers = self.constraint_workers.get(constraint_id)
+        return next(iter(workers)) if workers else None
+
+    def _wait(self, timeout=None):
+        """Blocks until a busy solver or executor sends a result or dies, or until the timeout expires."""
+        waiting = {}
+        for worker_id in self.busy_workers:
+            for waitable in self.worker_pool[worker_id].waitables():
+                waiting[waitable] = (self._collect, worker_id)
+        for executor_id in self.busy_executors:
+            for waitable in self.executor_pool[executor_id].waitables():
+                waiting[waitable] = (self._collectExecution, executor_id)
+        if len(waiting) == 0:
+            return
+        for ready in wait(list(waiting.keys()), timeout):
+            collect, worker_id = waiting[ready]
+            if worker_id in self.busy_workers or worker_id in self.busy_executors:
+                collect(worker_id)
 
     # private
 
+    def _collect(self, worker_id):
+        finished = self.worker_pool[worker_id].poll()
+        if finished is not None:
+            cancelled = worker_id in self.cancelled_workers
+            self._release_worker(worker_id)
+            if not self.worker_pool[worker_id].isRunning():
+                self.worker_paths.pop(worker_id, None)
+            if cancelled:
+                log.debug("Dropping the answer of cancelled worker {}".format(worker_id))
+            else:
+                self.finished_queries.append(finished)
+
+    def _collectExecution(self, executor_id):
+        job = self.executor_pool[executor_id].job
+        execution = self.executor_pool[executor_id].poll()
+        if execution is not None:
+            self.busy_executors.discard(executor_id)
+            self.finished_executions.append((job, execution))
+
+    def _assign_worker(self, worker_id, job):
+        timeout, constraint, solver = job
+        self.worker_jobs[worker_id] = job
+        self.busy_workers.add(worker_id)
+        self.constraint_workers.setdefault(constraint.id, set()).add(worker_id)
+
+    def _release_worker(self, worker_id):
+        timeout, constraint, solver = self.worker_jobs[worker_id]
+        self.worker_jobs[worker_id] = None
+        self.busy_workers.discard(worker_id)
+        self.cancelled_workers.discard(worker_id)
+        self._detach_worker(worker_id, constraint.id)
+
+    def _detach_worker(self, worker_id, constraint_id):
+        workers = self.constraint_workers.get(constraint_id, set())
+        workers.discard(worker_id)
+        if len(workers) == 0:
+            self.constraint_workers.pop(constraint_id, None)
+
+    def _kill_worker(self, worker_id):
+        self._release_worker(worker_id)
+        self.worker_pool[worker_id].kill()
+        self.worker_paths.pop(worker_id, None)
+
+    def _cancel(self, constraint_id):
+        """Interrupts the workers still solving the constraint, i.e. the solvers that lost the portfolio race.
+        Their processes and solvers are kept; they stay busy until they report, and their answer is dropped."""
+        while self._running_constraint(constraint_id) is not None:
+            worker_id = self._running_constraint(constraint_id)
+            timeout, constraint, solver = self.worker_jobs[worker_id]
+            log.debug("Cancelling {} on worker {}".format(solver, worker_id))
+            self.outstanding_constraint_attempts[(constraint_id, timeout)] -= 1
+            self.worker_pool[worker_id].cancel()
+            self.cancelled_workers.add(worker_id)
+            self._detach_worker(worker_id, constraint_id)
+
+    def _affinity(self, constraint):
+        """With incremental solving, the workers whose session holds a part of the path of the constraint, longest
+        shared path first; None otherwise."""
+        if not self.incremental or len(self.worker_paths) == 0:
+            return None
+        shared = {}
+        for worker_id, last in self.worker_paths.items():
+            # walk up from the constraint to the path of the worker, which is usually close for related queries
+            path = last.getPathIds()
+            node = constraint
+            while node.id not in path:
+                node = node.parent
+            if node.parent is not None:
+                shared[worker_id] = node.getLength()
+        return sorted(shared, key=shared.get, reverse=True)
+
     def _runningSolvers(self):
-        for worker_id, worker in self.worker_pool.items():
-            if worker is not None and not worker.is_alive():
-                worker.terminate()
-                self.worker_pool[worker_id] = None
-                self.worker_jobs[worker_id] = None
-        return sum(1 if solver_worker is not None else 0 for solver_worker in self.worker_pool.values())
-
-    def _launch_worker(self, selected_id, selected_timeout, selected_constraint, solver):
-        """
-        if solver not in {'z3', 'cvc', 'z3str2', 'multi'}:
-            raise Exception("Unknown solver %s" % solver)
-
-        if solver == 'multi':
-            primary, secondary = ('cvc', 'z3str2') if any(isinstance(input, str) for input in self.symbolic_inputs.values()) else ('z3', 'cvc')
-            self._launch_worker(selected_id, selected_timeout, selected_constraint, primary)
-            while self._runningSolvers() == len(self.worker_pool):
-                log.debug("Waiting for spot for second solver")
-                self._wait()
-            self._launch_worker(selected_id, selected_timeout, selected_constraint, secondary)
-            return
-        """
+        return len(self.busy_workers)
+
+    def _dispatch(self):
+        """Launches the next queued constraint that the scheduling policy can place on a worker. Returns False if
+        nothing could be launched."""
+        if self.constraints_to_solve.empty() or self._runningSolvers() == len(self.worker_pool):
+            return False
+
+        ## Find constraint with free worker
+        placement = {}  # the decision of the scheduling policy for the last constraint considered
+
+        def accepts(timeout, constraint):
+            affinity = self._affinity(constraint)
+            predicted = self.hardness.predict(constraint.features)
+            worker_id = self.scheduling_policy(self.worker_jobs, self.solvetimeouts, timeout, affinity, predicted)
+            placement.update(worker_id=worker_id, affinity=affinity, predicted=predicted)
+            return worker_id is not None
 
-        self.outstanding_constraint_attempts[(selected_id, selected_timeout)] = self.outstanding_constraint_attempts.get((selected_id, selected_timeout), 0) + 1
+        selection = self.constraints_to_solve.select(accepts)
+        if selection is None:
+            return False
+        selected_timeout, selected = selection
+        candidate_worker, affinity, predicted = placement["worker_id"], placement["affinity"], placement["predicted"]
+
+        if not selected.processed and not self.pruned(selected):
+            path_asserts, query = selected.getAssertsAndQuery()
+            if self.loop_summaries:
+                summarized = summarizeLoops(selected)
+                if summarized is not None:
+                    self.summarized_queries += 1
+                    path_asserts = summarized
+            # only the asserts that share variables with the query matter, the other variables keep the values
+            # of the execution that created the constraint
+            asserts = ExplorationEngine._coneOfInfluence(path_asserts, query)
+            if len(asserts) < len(path_asserts):
+                self.sliced_queries += 1
+            key = QueryCache.key(asserts, query)
+            cached = self.query_cache.get(key)
+            if cached is not None:
+                log.debug("Query of constraint {} answered from the cache".format(selected.id))
+                result, model = cached
+                self.outstanding_constraint_attempts[(selected.id, selected_timeout)] = \
+                    self.outstanding_constraint_attempts.get((selected.id, selected_timeout), 0) + 1
+                self.finished_queries.append((selected.id, selected_timeout, result, model, 0, "cache", None))
+                return True
+            if self._containsUnsatCore(path_asserts, query):
+                log.debug("Query of constraint {} contains an unsat core".format(selected.id))
+                self.core_hits += 1
+                self.query_cache.put(key, "UNSAT", None)
+                self.outstanding_constraint_attempts[(selected.id, selected_timeout)] = \
+                    self.outstanding_constraint_attempts.get((selected.id, selected_timeout), 0) + 1
+                self.finished_queries.append((selected.id, selected_timeout, "UNSAT", None, 0, "core", None))
+                return True
+            model = self._reuseModel(selected, asserts, query)
+            if model is not None:
+                log.debug("Query of constraint {} answered by an earlier model".format(selected.id))
+                self.reused_models += 1
+                self.query_cache.put(key, "SAT", model)
+                self.outstanding_constraint_attempts[(selected.id, selected_timeout)] = \
+                    self.outstanding_constraint_attempts.get((selected.id, selected_timeout), 0) + 1
+                self.finished_queries.append((selected.id, selected_timeout, "SAT", model, 0, "reuse", None))
+                return True
+            self.query_keys[selected.id] = key
+            if self.incremental:
+                # the sessions hold path prefixes, which slicing would break up; _solve slices in the worker
+                asserts = path_asserts
+                if affinity is not None and candidate_worker in affinity:
+                    self.shared_prefixes += 1
+            self._launch_worker(selected_timeout, selected, asserts, query, self.portfolio[0], candidate_worker)
+            # the rest of the portfolio only takes free workers, it never preempts
+            for solver in self.portfolio[1:]:
+                worker_id = self.scheduling_policy(self.worker_jobs, self.solvetimeouts, selected_timeout, affinity,
+                                                   predicted)
+                if worker_id is None or self.worker_jobs[worker_id] is not None:
+                    log.debug("No free worker to race {} on constraint {}".format(solver, selected.id))
+                    break
+                self._launch_worker(selected_timeout, selected, asserts, query, solver, worker_id)
+        return True
+
+    def _launch_worker(self, selected_timeout, selected_constraint, asserts, query, solver, worker_id):
+        self.outstanding_constraint_attempts[(selected_constraint.id, selected_timeout)] = \
+            self.outstanding_constraint_attempts.get((selected_constraint.id, selected_timeout), 0) + 1
+
+        if worker_id in self.cancelled_workers:
+            # the constraint of the worker was already decided
+            self._kill_worker(worker_id)
+        elif self.worker_jobs[worker_id] is not None:
+            running_timeout, running_constraint, running_solver = self.worker_jobs[worker_id]
+            log.debug("Preempting constraint {} on worker {}".format(running_constraint.id, worker_id))
+            self.outstanding_constraint_attempts[(running_constraint.id, running_timeout)] -= 1
+            running_constraint.processed = False
+            self._enqueue(running_timeout, running_constraint)
+            self._kill_worker(worker_id)
+
+        job = selected_timeout, selected_constraint, solver
+        self.worker_paths[worker_id] = selected_constraint
+        self.worker_pool[worker_id].submit(job, solver, selected_constraint.id, selected_timeout, asserts, query)
+        self._assign_worker(worker_id, job)
 
-        worker_id = self.scheduling_policy(self.worker_pool, self.solvetimeouts, selected_timeout)
-        if self.worker_pool[worker_id] is not None:
-            running_timeout, running_constraint = self.worker_jobs[worker_id]
-            self.constraints_to_solve.put((running_timeout, running_constraint))
-            self.worker_pool[worker_id].terminate()
-            self.worker_pool[worker_id] = None
-            self.worker_jobs[worker_id] = None
+    @staticmethod
+    def _solve(solvers, solver_type, asserts, query, selected_timeout, query_store, incremental, unsat_cores):
+        """Runs inside a solver worker; solvers caches the solver instances of the worker between queries."""
+        if solver_type not in solvers:
+            solvers[solver_type] = ExplorationEngine._solverInstance(solver_type, query_store, incremental,
+                                                                     unsat_cores)
+        solver_instance = solvers[solver_type]
+        if incremental:
+            # the asserts are the whole path: an incremental solver keeps them as its prefix and its model is
+            # restricted to the cone of influence, as if the query had been sliced
+            cone = ExplorationEngine._coneOfInfluence(asserts, query)
+            if not getattr(solver_instance, "incremental", False):
+                asserts = cone
+        result, model, solving_time = solver_instance.findCounterexample(asserts, query, timeout=selected_timeout)
+        if incremental and model is not None:
+            variables = set(query.getVars()).union(*[a.getVars() for a in cone])
+            model = {name: value for name, value in model.items() if name in variables}
+        core = None
+        if result == "UNSAT" and getattr(solver_instance, "unsat_core", None) is not None:
+            core = frozenset(p.key() for p in solver_instance.unsat_core)
+        return result, model, solving_time, core
+
+    def _containsUnsatCore(self, asserts, query):
+        """Whether the asserts and the negated query include all predicates of a learned unsat core."""
+        if not self.unsat_cores:
+            return False
+        keys = {a.key() for a in asserts}
+        keys.add((not query.result, query.symtype.structuralKey()))
+        return any(core <= keys for core in self.unsat_cores)
+
+    def _reuseModel(self, constraint, asserts, query):
+        """Looks for a recent input or model that solves the query: its values for the variables of the query,
+        with the other variables as in the inputs of the constraint, satisfy the asserts and negate the query.
+        Returns the values of the query variables, None if no candidate fits."""
+        if self.reuse_candidates is None or len(self.reuse_candidates) == 0:
+            return None
+        inputs = constraint.inputs if constraint.inputs is not None else self.symbolic_inputs
+        base = {name: self._getConcrValue(value) for name, value in inputs.items()}
+        variables = set(query.getVars()).union(*[a.getVars() for a in asserts])
+        negated = Predicate(query.symtype, not query.result)
+        for candidate in reversed(self.reuse_candidates):
+            env = dict(base)
+            env.update((name, value) for name, value in candidate.items() if name in variables)
+            if satisfies(negated, env) and all(satisfies(a, env) for a in asserts):
+                return {name: env[name] for name in variables if name in env}
+        return None
 
-        asserts, query = selected_constraint.getAssertsAndQuery()
-        p = Process(target=self._solve, args=(
-            self.finished_queries, solver, selected_id, selected_timeout, asserts, query, self.query_store))
-        self.worker_pool[worker_id] = p
-        self.worker_jobs[worker_id] = selected_timeout, selected_constraint
-        p.start()
+    @staticmethod
+    def _coneOfInfluence(asserts, query):
+        """The asserts that share variables with the query, directly or through other asserts of the cone."""
+        cone_vars = set(query.getVars())
+        remaining = [(a, set(a.getVars())) for a in asserts]
+        cone = []
+        grown = True
+        while grown:
+            grown = False
+            outside = []
+            for a, a_vars in remaining:
+                if a_vars & cone_vars:
+                    cone.append(a)
+                    cone_vars |= a_vars
+                    grown = True
+                else:
+                    outside.append((a, a_vars))
+            remaining = outside
+        return cone
 
     @staticmethod
-    def _solve(finished_queries, solver_type, selected_id, selected_timeout, asserts, query, query_store):
-        """
-        if solver_type == 'z3':
+    def _solverInstance(solver_type, query_store, incremental=False, unsat_cores=False):
+        """Creates the solver for a portfolio entry such as 'z3', 'cvc' or 'z3:use_lia=false'. The settings after
+        the solver name set wrapper attributes (e.g. use_lia, incremental, produce_cores) or solver options (CVC,
+        Z3-str2)."""
+        name, *settings = solver_type.split(":")
+        if name == "z3":
+            from .z3_wrap import Z3Wrapper
             solver_instance = Z3Wrapper()
-        elif solver_type == 'cvc':
+        elif name == "cvc":
             from .cvc_wrap import CVCWrapper
-            solver_instance = CVCWrapper(query_store=query_store)
-        elif solver_type == "z3str2":
+            solver_instance = CVCWrapper(query_store=query_store, solver_type=solver_type)
+        elif name == "z3str2":
             from .z3str2_wrap import Z3Str2Wrapper
             solver_instance = Z3Str2Wrapper(query_store=query_store)
-        """
-        from .cvc_wrap import CVCWrapper
-        solver_instance = CVCWrapper(query_store=query_store, solver_type=solver_type)
-        result, model, solving_time = solver_instance.findCounterexample(asserts, query, timeout=selected_timeout)
-        finished_queries.put((selected_id, selected_timeout, result, model, solving_time))
+        else:
+            raise ValueError("Unknown solver {}".format(solver_type))
+        if hasattr(solver_instance, "incremental"):
+            solver_instance.incremental = incremental
+        if hasattr(solver_instance, "produce_cores"):
+            solver_instance.produce_cores = unsat_cores
+        for setting in settings:
+            key, _, value = setting.partition("=")
+            if not hasattr(solver_instance, key) and isinstance(getattr(solver_instance, "options", None), dict):
+                solver_instance.options[key] = value
+            elif value in ("true", "false"):
+                setattr(solver_instance, key, value == "true")
+            else:
+                try:
+                    setattr(solver_instance, key, int(value))
+                except ValueError:
+                    setattr(solver_instance, key, value)
+        return solver_instance
 
     def _updateSymbolicParameter(self, name, val):
         self.symbolic_inputs[name] = self.invocation.createArgumentValue(name, val)
@@ -319,17 +595,14 @@ class ExplorationEngine:
         self.symbolic_inputs = d
 
     def _isExplorationComplete(self):
-        num_constr = self.constraints_to_solve.qsize()
-        if num_constr == 0 and self._runningSolvers() == 0 and self.finished_queries.empty():
+        num_constr = len(self.constraints_to_solve)
+        if num_constr == 0 and self._runningSolvers() == 0 and len(self.finished_queries) == 0 and \
+                len(self.busy_executors) == 0 and len(self.pending_executions) + len(self.finished_executions) == 0:
             log.info("Exploration complete")
             return True
         else:
             constraints_to_solve = num_constr + self._runningSolvers()
-            try:
-                pending_process = self.finished_queries.qsize()
-            except NotImplementedError:
-                assert platform == 'darwin'  #only allow this hack on OS X
-                pending_process = 0
+            pending_process = len(self.finished_queries)
             processed_constraints = self.num_processed_constraints
             log.info("%d constraints yet to solve (total: %d, already solved: %d)" % (
                 constraints_to_solve, constraints_to_solve + pending_process + processed_constraints,
@@ -342,47 +615,134 @@ class ExplorationEngine:
         else:
             return v
 
-    def _recordInputs(self):
-        args = self.symbolic_inputs
+    def _recordInputs(self, args):
         inputs = [(k, self._getConcrValue(args[k])) for k in args]
         self.generated_inputs.append(inputs)
+        if self.reuse_candidates is not None:
+            self.reuse_candidates.append(dict(inputs))
         print(inputs)
 
     def _oneExecution(self, expected_path=None):
-        self._recordInputs()
+        self._recordInputs(self.symbolic_inputs)
         self.path.reset(expected_path)
+        ret, cov = self._run(self.invocation, self.symbolic_inputs)
+        self._finishExecution(self._getInputs(), ret, cov, self.last_solve_time)
+
+    def _launch_executor(self, selected, inputs, solving_time):
+        executor_id = next(i for i in self.executor_pool if i not in self.busy_executors)
+        concrete_inputs = {name: self._getConcrValue(value) for name, value in inputs.items()}
+        self.executor_pool[executor_id].submit((selected, inputs, solving_time), selected.id, concrete_inputs)
+        self.busy_executors.add(executor_id)
+
+    def _mergeExecution(self, job, execution):
+        """Replays the branches taken in an executor process into the constraint tree."""
+        selected, inputs, solving_time = job
+        selected_id, trace, measured_coverage, ret = execution
+        self._recordInputs(inputs)
+        self.path.reset(selected)
+        for predicate, branch_id in trace:
+            self.path.whichBranch(predicate.result, predicate.symtype, branch_id)
+        cov = coverage.CoverageData()
+        # branch coverage is measured, so the arcs determine the lines
+        cov.add_arcs({file: dict.fromkeys(arcs) for file, (lines, arcs) in measured_coverage.items()})
+        self._finishExecution(inputs, ret, cov, solving_time)
+
+    def _finishExecution(self, inputs, ret, cov, solving_time):
+        self.one_execution_coverage = cov
+        self.generation += 1
+        coverage_gain = self._coverageGain(cov)
+        self.global_execution_coverage.update(self.one_execution_coverage)
+        total_lines, executed_lines, executed_branches = self.coverage_statistics()
+        log.info("Line coverage {}/{} ({:.2%})".format(executed_lines, total_lines, (executed_lines/total_lines) if total_lines > 0 else 0))
+        log.info("Branch coverage {}".format(executed_branches))
+
+        # parents are summarized before their children
+        for constraint in self.new_constraints:
+            constraint.inputs = inputs
+            constraint.set_coverage(self.one_execution_coverage)
+            constraint.solving_time = solving_time
+            constraint.generation = self.generation
+            constraint.coverage_gain = coverage_gain
+            self.site_hits[constraint.branch_id] = self.site_hits.get(constraint.branch_id, 0) + 1
+            constraint.summarize(self.coverage_pruning)
+
+        while len(self.new_constraints) > 0:
+            constraint = self.new_constraints.pop()
+            if self._overBudget(constraint):
+                continue
+            self.site_constraints[constraint.branch_id] = self.site_constraints.get(constraint.branch_id, 0) + 1
+            self._enqueue(self.timeout_ladder.start(constraint), constraint)
+
+        print(ret)
+        self.execution_return_values.append(ret)
+
+    @staticmethod
+    def _run(invocation, symbolic_inputs):
+        """Calls the function under test while measuring its coverage."""
+        cov = coverage.Coverage(omit=["*pyexz3.py", "*symbolic*", "*pydev*", "*coverage*"], branch=True)
         try:
-            cov = coverage.Coverage(omit=["*pyexz3.py", "*symbolic*", "*pydev*", "*coverage*"], branch=True)
             cov.start()
-            ret = self.invocation.callFunction(self.symbolic_inputs)
-            cov.stop()
-            self.one_execution_coverage = cov.get_data()
-            self.global_execution_coverage.update(self.one_execution_coverage)
-            total_lines, executed_lines, executed_branches = self.coverage_statistics()
-            log.info("Line coverage {}/{} ({:.2%})".format(executed_lines, total_lines, (executed_lines/total_lines) if total_lines > 0 else 0))
-            log.info("Branch coverage {}".format(executed_branches))
-
-            while len(self.new_constraints) > 0:
-                constraint = self.new_constraints.pop()
-                constraint.inputs = self._getInputs()
-                constraint.set_coverage(self.one_execution_coverage)
-                constraint.solving_time = self.last_solve_time
-                self.constraints_to_solve.put((self.solvetimeouts[0], constraint))
-
+            ret = invocation.callFunction(symbolic_inputs)
         except Exception as e:
             print("Exception")
-            instrumentation_keywords = {"pyexz3.py", "symbolic", "pydev", "coverage"}
-            exc_type, exc_value, exc_traceback = exc_info()
-            for filename, line, function, text in reversed(traceback.extract_tb(exc_traceback)):
-                if any(instrumentation_keyword in filename for instrumentation_keyword in instrumentation_keywords):
-                    continue
-                else:
-                    e.id = "{}:{}".format(filename, line)
-                    print(e.id)
-                    break
+            site = exceptionSite(e.__traceback__)
+            if site is not None:
+                e.id = site
+                print(e.id)
             ret = e
-        print(ret)
-        self.execution_return_values.append(ret)
+        finally:
+            cov.stop()
+        return ret, cov.get_data()
+
+    @staticmethod
+    def _execute(invocation, selected_id, inputs):
+        """Runs inside an executor worker: executes the function under test on the given concrete inputs and
+        returns the branches it took, as (Predicate, branch_id) from the root, with the coverage it reached."""
+        path = PathToConstraint(lambda c: None, invocation.name)
+        symbolic_type.SymbolicObject.SI = path
+        symbolic_inputs = {name: invocation.createArgumentValue(name, value) for name, value in inputs.items()}
+        ret, cov = ExplorationEngine._run(invocation, symbolic_inputs)
+        trace = []
+        c = path.current_constraint
+        while c.predicate is not None:
+            trace.append((c.predicate, c.branch_id))
+            c = c.parent
+        trace.reverse()
+        measured_coverage = {file: (cov.lines(file), cov.arcs(file)) for file in cov.measured_files()}
+        return selected_id, trace, measured_coverage, ret
+
+    def _overBudget(self, constraint, requeued=False):
+        """Whether the branch site of the constraint has exhausted one of its budgets: the number of constraints
+        queued at the site, the solver time spent on them, or the number of times the site occurs on the path of
+        the constraint (loop unrolling). A requeued constraint was already counted and only checks the solver
+        time."""
+        site = constraint.branch_id
+        exhausted = None
+        if self.max_site_solve_time is not None and self.site_solve_time.get(site, 0) >= self.max_site_solve_time:
+            exhausted = "solve time"
+        elif requeued:
+            return False
+        elif self.max_site_constraints is not None and self.site_constraints.get(site, 0) >= self.max_site_constraints:
+            exhausted = "constraints"
+        elif self.max_unroll is not None and constraint.unroll_depth > self.max_unroll:
+            exhausted = "unroll"
+        if exhausted is None:
+            return False
+        log.debug("Branch site {} exhausted its {} budget, skipping constraint {}".format(site, exhausted, constraint.id))
+        skips = self.budget_skips.setdefault(site, {})
+        skips[exhausted] = skips.get(exhausted, 0) + 1
+        return True
+
+    def _enqueue(self, timeout, constraint):
+        self.constraints_to_solve.put(timeout, constraint)
+
+    def _coverageGain(self, cov):
+        """The number of lines and arcs covered by cov that no earlier execution covered."""
+        gain = 0
+        for file in cov.measured_files():
+            gain += len(set(cov.lines(file) or ()) - set(self.global_execution_coverage.lines(file) or ()))
+            gain += len(set(cov.arcs(file) or ()) - set(self.global_execution_coverage.arcs(file) or ()))
+        return gain
 
     def coverage_statistics(self):
         cov = coverage.Coverage(omit=["*pyexz3.py", "*symbolic*", "*pydev*", "*coverage*"], branch=True)
@@ -395,10 +755,3 @@ class ExplorationEngine:
             executed_lines += len(set(self.global_execution_coverage.lines(file)))
             executed_branches += len(set(self.global_execution_coverage.arcs(file)))
         return total_lines, executed_lines, executed_branches
-
-
-    def frozen_model(self, inputs):
-        if inputs is None:
-            return None
-        else:
-            return frozenset((k, v) for k, v in inputs.items())
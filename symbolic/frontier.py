@@ -0,0 +1,100 @@
+# Copyright: see copyright.txt
+
+import heapq
+import itertools
+import math
+import random
+
+# An order breaks the ties between the constraints that the search strategy gives the same key, from the
+# constraint and the sequence number of its insertion: smaller values are solved first.
+ORDERS = {
+    # longest path first, then the last queued
+    "depth_first": lambda constraint, sequence: (-constraint.depth, -sequence),
+    # in the order the constraints were queued
+    "breadth_first": lambda constraint, sequence: (sequence,),
+    # shortest path first, then the first queued
+    "shortest_first": lambda constraint, sequence: (constraint.depth, sequence),
+    # a constraint at depth d is picked with a probability proportional to 2 ** -d, as by a random walk from the
+    # root of a binary tree: the smallest of exponential variables of rates 2 ** -d
+    "random_path": lambda constraint, sequence: (math.ldexp(random.expovariate(1.0), min(constraint.depth, 1000)),),
+}
+
+
+class Frontier:
+    """The constraints waiting for a solver, in one bucket per solve timeout. A bucket is a heap ordered by the
+    search strategy (see search_strategies.py), then by the order; buckets of shorter timeouts come first.
+
+    select asks the scheduling decision for the first constraint of each bucket only: the constraints of a bucket
+    share their timeout, so when the first is refused the bucket is skipped, without popping and pushing back the
+    others. With scan set, the decision depends on more than the timeout (e.g. the predicted solve time), so the
+    constraints of a bucket are asked in order until one is accepted."""
+
+    def __init__(self, search_strategy, exploration, order="depth_first", scan=False):
+        if order not in ORDERS:
+            raise ValueError("Unknown frontier order {}, expected one of {}".format(order, ", ".join(sorted(ORDERS))))
+        self.search_strategy = search_strategy
+        self.rescore = getattr(search_strategy, "rescore", False)
+        self.exploration = exploration
+        self.order = ORDERS[order]
+        self.scan = scan
+        self.buckets = {}  # {timeout: heap of (strategy key, order key, Constraint)}
+        self.sequence = itertools.count()
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def empty(self):
+        return self.size == 0
+
+    def put(self, timeout, constraint):
+        entry = self.search_strategy(constraint, self.exploration), self.order(constraint, next(self.sequence)), \
+            constraint
+        heapq.heappush(self.buckets.setdefault(timeout, []), entry)
+        self.size += 1
+
+    def select(self, accepts):
+        """Removes and returns (timeout, constraint) for the first constraint, in order, of the first bucket for
+        which accepts(timeout, constraint) holds, None if there is none. Without scan only the first constraint of
+        each bucket is asked. With a rescoring strategy, the key of the first constraint of a bucket is recomputed
+        before it is considered."""
+        for timeout in sorted(self.buckets):
+            bucket = self.buckets[timeout]
+            if self.rescore:
+                rescored = set()
+                while bucket[0][2].id not in rescored:
+                    key, order, constraint = bucket[0]
+                    rescored.add(constraint.id)
+                    new_key = self.search_strategy(constraint, self.exploration)
+                    if new_key != key:
+                        heapq.heapreplace(bucket, (new_key, order, constraint))
+            for index in (self._inOrder(bucket) if self.scan else [0]):
+                constraint = bucket[index][2]
+                if accepts(timeout, constraint):
+                    self._remove(timeout, index)
+                    return timeout, constraint
+        return None
+
+    def _remove(self, timeout, index):
+        bucket = self.buckets[timeout]
+        if index == 0:
+            heapq.heappop(bucket)
+        else:
+            bucket[index] = bucket[-1]
+            bucket.pop()
+            heapq.heapify(bucket)
+        if len(bucket) == 0:
+            del self.buckets[timeout]
+        self.size -= 1
+
+    @staticmethod
+    def _inOrder(bucket):
+        """The indices of the entries of a heap in order, visiting only as many entries as are consumed: the
+        candidates are the children of the entries already given."""
+        candidates = [(bucket[0], 0)]
+        while len(candidates) > 0:
+            _, index = heapq.heappop(candidates)
+            yield index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(bucket):
+                    heapq.heappush(candidates, (bucket[child], child))
@@ -0,0 +1,253 @@
+# Copyright: see copyright.txt
+
+import ast
+import functools
+import inspect
+import logging
+
+from .branch_sites import callerBranchId
+from .evaluator import evaluate, satisfies
+from .predicate import Predicate
+from .symbolic_types.symbolic_int import SymbolicInteger
+from .symbolic_types.symbolic_type import SymbolicObject, SymbolicType
+
+log = logging.getLogger("se.summaries")
+
+MAX_ENTRIES = 32  # summary entries kept per function and argument shape
+FORMAL = "__arg{}"
+
+# the operators symbolic integers compute symbolically, the others work on the concrete value
+SYMBOLIC_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Mod, ast.FloorDiv, ast.BitAnd, ast.BitOr, ast.BitXor, ast.LShift,
+                ast.RShift)
+# the builtins that only compare their arguments or look at concrete containers
+SAFE_BUILTINS = {"bool", "isinstance", "len", "max", "min"}
+# constructs that may change state outside the call or use the concrete value of a symbolic argument: attributes
+# (method calls, attribute stores), subscripts (table[x] indexes with the concrete x), hashing, formatting, ...
+IMPURE_NODES = (ast.Global, ast.Nonlocal, ast.Attribute, ast.Subscript, ast.Set, ast.Dict, ast.SetComp, ast.DictComp,
+                ast.FormattedValue, ast.Yield, ast.YieldFrom, ast.Await, ast.Import, ast.ImportFrom, ast.FunctionDef,
+                ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+
+
+class FunctionSummaries:
+    """Compositional summaries of the functions of the target module, so that a helper is not explored again inside
+    every path of its callers.
+
+    A call of a function with some argument shape (integers, symbolic or not, possibly in tuples; concrete values
+    are part of the shape) runs it on fresh formal variables instead of the symbolic arguments, and its branches and
+    return value are kept as an entry of the summary of the function. A call checks the entries in order like an
+    if-elif chain: the entries whose path condition does not hold branch False, the first that holds branches True
+    and gives the return value without running the function.
+    When none holds, the function runs, a new entry is recorded and the call branches True on its condition, so
+    that negating the last condition of the chain asks the solver for a path of the function not seen yet.
+
+    Only the functions whose return value is symbolic, or constant under the recorded path condition, and that
+    change no state are summarized (see _pureFunctions), and only calls returning integers, booleans, None or
+    tuples of them record entries; other calls run the function as usual."""
+
+    def __init__(self):
+        self.summaries = {}  # {(function name, argument shape): [(path condition [Predicate], return value)]}
+        self.pure = {}  # {module file: names of the functions that can be summarized}
+        self.recorded = 0
+        self.hits = 0
+
+    def instrument(self, module, exclude=()):
+        """Replaces the functions defined in the module that can be summarized by summarizing wrappers, except the
+        names in exclude."""
+        functions = {name: value for name, value in module.__dict__.items()
+                     if inspect.isfunction(value) and value.__module__ == module.__name__}
+        pure = self.pure.get(module.__file__)
+        if pure is None:
+            pure = _pureFunctions(module, functions)
+            self.pure[module.__file__] = pure
+            log.debug("Functions summarized: {}".format(", ".join(sorted(pure - set(exclude)))))
+        for name, value in functions.items():
+            if name in pure and name not in exclude:
+                module.__dict__[name] = self._wrap(value)
+
+    def _wrap(self, function):
+        @functools.wraps(function)
+        def summarized(*args, **kwargs):
+            outer = SymbolicObject.SI
+            formals = {}  # {formal name: actual argument}
+            shape = _shape(args, formals)
+            if outer is None or len(kwargs) > 0 or shape is None or len(formals) == 0:
+                return function(*args, **kwargs)
+            env = {name: actual.getConcrValue() for name, actual in formals.items()}
+            entries = self.summaries.setdefault((function.__qualname__, shape), [])
+            for condition, ret in entries:
+                holds = all(satisfies(p, env) for p in condition)
+                if len(condition) > 0:
+                    outer.whichBranch(holds, _conjunction(condition, formals, holds))
+                if holds:
+                    try:
+                        ret = _instantiate(ret, formals, env)
+                    except Exception as e:
+                        log.debug("Could not instantiate the summary of {}: {}".format(function.__qualname__, e))
+                        break
+                    self.hits += 1
+                    return ret
+            recorder = _Recorder()
+            SymbolicObject.SI = recorder
+            summarized = False
+            try:
+                ret = function(*_formalArguments(args, iter(formals)))
+                summarized = _summarizable(ret) and len(entries) < MAX_ENTRIES
+            finally:
+                SymbolicObject.SI = outer
+                condition = [Predicate(symbolic_type, result) for result, symbolic_type, _ in recorder.branches]
+                if not summarized:
+                    for result, symbolic_type, branch_id in recorder.branches:
+                        outer.whichBranch(result, _instantiate(symbolic_type, formals), branch_id)
+                elif len(condition) > 0:
+                    # the path of the new entry, as it is taken by the next calls that hold its condition
+                    outer.whichBranch(True, _conjunction(condition, formals, True))
+            if summarized:
+                entries.append((condition, ret))
+                self.recorded += 1
+            return _instantiate(ret, formals)
+
+        return summarized
+
+
+def _pureFunctions(module, functions):
+    """The names of the functions of the module whose calls only compute a return value from their arguments with
+    symbolic operators and branches, so that the value is symbolic or constant under the path condition of the call:
+    no construct of IMPURE_NODES, no operator outside SYMBOLIC_OPS, no name other than locals, module constants
+    that are never rebound, the SAFE_BUILTINS and functions of the module that are themselves pure."""
+    try:
+        tree = ast.parse(inspect.getsource(module))
+    except (OSError, TypeError, SyntaxError) as e:
+        log.debug("No function summaries for {}: {}".format(module.__name__, e))
+        return set()
+    rebound = {name for node in ast.walk(tree) if isinstance(node, (ast.Global, ast.Nonlocal)) for name in node.names}
+    callees = {}  # {name: names of the module functions it calls} of the functions pure on their own
+    for definition in tree.body:
+        if isinstance(definition, ast.FunctionDef) and definition.name in functions:
+            names = _callees(definition, module.__dict__, functions, rebound)
+            if names is not None:
+                callees[definition.name] = names
+    pure = set(callees)
+    changed = True
+    while changed:
+        impure = {name for name in pure if not callees[name] <= pure}
+        pure -= impure
+        changed = len(impure) > 0
+    return pure
+
+
+def _callees(definition, namespace, functions, rebound):
+    """The names of the module functions that the definition uses, None if it is not pure on its own."""
+    if len(definition.decorator_list) > 0:
+        return None
+    arguments = definition.args
+    local = {a.arg for a in arguments.posonlyargs + arguments.args + arguments.kwonlyargs} | \
+            {a.arg for a in (arguments.vararg, arguments.kwarg) if a is not None} | \
+            {node.id for node in ast.walk(definition)
+             if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load)}
+    ret = set()
+    for node in ast.walk(definition):
+        if isinstance(node, IMPURE_NODES) and node is not definition:
+            return None
+        elif isinstance(node, (ast.BinOp, ast.AugAssign)) and not isinstance(node.op, SYMBOLIC_OPS):
+            return None
+        elif isinstance(node, ast.UnaryOp) and not isinstance(node.op, ast.Not):
+            return None
+        elif isinstance(node, ast.Compare) and any(isinstance(op, (ast.In, ast.NotIn)) and
+                                                   not isinstance(container, (ast.Tuple, ast.List))
+                                                   for op, container in zip(node.ops, node.comparators)):
+            # membership in anything but a display may hash the value
+            return None
+        elif isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.func.id in local):
+            return None
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in local:
+            if node.id in functions:
+                ret.add(node.id)
+            elif node.id in namespace:
+                if node.id in rebound or not _constant(namespace[node.id]):
+                    return None
+            elif node.id not in SAFE_BUILTINS:
+                return None
+    return ret
+
+
+def _constant(value):
+    if isinstance(value, (tuple, frozenset)):
+        return all(_constant(v) for v in value)
+    return value is None or isinstance(value, (int, float, str, bytes))
+
+
+class _Recorder:
+    """Stands in for PathToConstraint while a summarized function runs: its branches are recorded, not added to
+    the path."""
+
+    def __init__(self):
+        self.branches = []  # (result, symbolic type over the formals, branch_id)
+
+    def whichBranch(self, branch, symbolic_type, branch_id=None):
+        if branch_id is None:
+            branch_id = callerBranchId(branch)
+        self.branches.append((branch, symbolic_type, branch_id))
+
+
+def _shape(value, formals):
+    """The shape of the arguments: integers and tuples, symbolic integers replaced by the name of a new formal,
+    which is added to formals. None for other values."""
+    if isinstance(value, SymbolicInteger):
+        name = FORMAL.format(len(formals))
+        formals[name] = value
+        return "int",
+    elif isinstance(value, SymbolicType):
+        return None
+    elif isinstance(value, int):
+        return type(value).__name__, value
+    elif isinstance(value, tuple):
+        shapes = tuple(_shape(v, formals) for v in value)
+        return None if None in shapes else shapes
+    return None
+
+
+def _formalArguments(value, names):
+    """The arguments with their symbolic integers replaced by the formals, in the order of _shape."""
+    if isinstance(value, SymbolicInteger):
+        name = next(names)
+        return SymbolicInteger(name, value.getConcrValue())
+    elif isinstance(value, tuple):
+        return tuple(_formalArguments(v, names) for v in value)
+    return value
+
+
+def _summarizable(value):
+    if isinstance(value, tuple):
+        return all(_summarizable(v) for v in value)
+    return value is None or isinstance(value, SymbolicInteger) or \
+        isinstance(value, int) and not isinstance(value, SymbolicType)
+
+
+def _instantiate(value, formals, env=None):
+    """The value of an expression over the formals for the actual arguments. Without env, the arguments are those
+    the expression was computed for and its concrete value is kept, otherwise it is evaluated for env."""
+    if isinstance(value, tuple):
+        return tuple(_instantiate(v, formals, env) for v in value)
+    if not isinstance(value, SymbolicType):
+        return value
+    if value.isVariable():
+        return formals.get(value.name, value)
+    concrete = value.getConcrValue() if env is None else evaluate(value, env)
+    return type(value).wrap(concrete, _substitute(value.expr, formals))
+
+
+def _substitute(expr, formals):
+    if isinstance(expr, list):
+        return [expr[0]] + [_substitute(e, formals) for e in expr[1:]]
+    elif isinstance(expr, SymbolicType):
+        if expr.isVariable():
+            return formals.get(expr.name, expr)
+        return _substitute(expr.expr, formals)
+    return expr
+
+
+def _conjunction(condition, formals, holds):
+    """The path condition of a summary entry over the actual arguments, as one symbolic integer."""
+    literals = [["!=" if p.result else "==", _substitute(p.symtype, formals), 0] for p in condition]
+    expr = literals[0] if len(literals) == 1 else ["and"] + literals
+    return SymbolicInteger("se", int(holds), expr)
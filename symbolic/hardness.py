@@ -0,0 +1,120 @@
+# Copyright: see copyright.txt
+
+import logging
+import math
+import weakref
+from collections import namedtuple
+
+from .symbolic_types.symbolic_type import SymbolicType
+from .symbolic_types.term import Term
+
+log = logging.getLogger("se.hardness")
+
+NONLINEAR_OPS = {"*", "//", "%", "**"}
+BITWISE_OPS = {"&", "|", "^", "<<", ">>", "~"}
+STRING_OPS = {"in", "slice", "getitem"}  # and every "str." operator
+
+# Cheap features of the query of a constraint: its path predicates and its own predicate.
+QueryFeatures = namedtuple("QueryFeatures", ["length", "nodes", "nonlinear", "strings", "bitwise", "variables"])
+
+
+_op_counts = weakref.WeakKeyDictionary()  # {Term: (nonlinear, strings, bitwise)} of the term and its arguments
+
+
+def predicateTerm(predicate):
+    """The Term of the expression of a predicate, or its variable (a SymbolicType) or constant."""
+    expr = predicate.symtype
+    return expr.expr if isinstance(expr, SymbolicType) and not expr.isVariable() else expr
+
+
+def _opCounts(term):
+    """The (nonlinear, strings, bitwise) operator counts of a term, from the memoized counts of its arguments:
+    terms are shared along a path, so only the nodes new to the predicate are visited."""
+    ret = _op_counts.get(term)
+    if ret is None:
+        op = term[0]
+        nonlinear, strings, bitwise = 0, 0, 0
+        if op in NONLINEAR_OPS and (op != "*" or sum(isinstance(arg, (Term, SymbolicType)) for arg in term[1:]) > 1):
+            nonlinear = 1
+        elif op in BITWISE_OPS:
+            bitwise = 1
+        elif op in STRING_OPS or str(op).startswith("str."):
+            strings = 1
+        for arg in term[1:]:
+            if isinstance(arg, Term):
+                counts = _opCounts(arg)
+                nonlinear, strings, bitwise = nonlinear + counts[0], strings + counts[1], bitwise + counts[2]
+        ret = nonlinear, strings, bitwise
+        _op_counts[term] = ret
+    return ret
+
+
+def queryFeatures(parent_features, predicate):
+    """The features of a constraint from those of its parent and its predicate; the counts add up along the path
+    and variables is the frozenset of the variable names of the path."""
+    nodes, nonlinear, strings, bitwise = 0, 0, 0, 0
+    variables = frozenset()
+    if predicate is not None:
+        term = predicateTerm(predicate)
+        if isinstance(term, Term):
+            nodes, variables = term.size, term.variables
+            nonlinear, strings, bitwise = _opCounts(term)
+        else:
+            nodes = 1
+            if isinstance(term, SymbolicType):
+                variables = frozenset([term.name])
+    if parent_features is None:
+        return QueryFeatures(0 if predicate is None else 1, nodes, nonlinear, strings, bitwise, variables)
+    if variables <= parent_features.variables:
+        variables = parent_features.variables
+    else:
+        variables = parent_features.variables | variables
+    return QueryFeatures(parent_features.length + 1, parent_features.nodes + nodes,
+                         parent_features.nonlinear + nonlinear, parent_features.strings + strings,
+                         parent_features.bitwise + bitwise, variables)
+
+
+class HardnessModel:
+    """Predicts the solve time of a query from its features, with a linear regression of the log of the solve time
+    on the log of the features, updated online (recursive least squares) with every solver answer. A timeout only
+    tells that the query takes at least the timeout, so it is learned as the timeout when the prediction is below."""
+
+    MIN_OBSERVATIONS = 3
+    MIN_TIME = 1e-4
+
+    def __init__(self, regularization=1.0):
+        dimension = len(QueryFeatures._fields) + 1
+        self.weights = [0.0] * dimension
+        self.covariance = [[1.0 / regularization if i == j else 0.0 for j in range(dimension)]
+                           for i in range(dimension)]
+        self.observations = 0
+
+    def predict(self, features):
+        """The predicted solve time in seconds, None until enough answers have been observed."""
+        if self.observations < HardnessModel.MIN_OBSERVATIONS:
+            return None
+        return math.exp(self._dot(self.weights, HardnessModel._vector(features)))
+
+    def observe(self, features, timeout, result, solving_time):
+        if result in ("SAT", "UNSAT"):
+            time = solving_time
+        else:
+            predicted = self.predict(features)
+            if predicted is not None and predicted >= timeout:
+                return
+            time = timeout
+        x = HardnessModel._vector(features)
+        px = [self._dot(row, x) for row in self.covariance]
+        gain = [v / (1.0 + self._dot(x, px)) for v in px]
+        error = math.log(max(time, HardnessModel.MIN_TIME)) - self._dot(self.weights, x)
+        self.weights = [w + g * error for w, g in zip(self.weights, gain)]
+        self.covariance = [[self.covariance[i][j] - gain[i] * px[j] for j in range(len(x))] for i in range(len(x))]
+        self.observations += 1
+
+    @staticmethod
+    def _vector(features):
+        return [1.0] + [math.log1p(len(f) if isinstance(f, frozenset) else f) for f in features]
+
+    @staticmethod
+    def _dot(a, b):
+        return sum(x * y for x, y in zip(a, b))
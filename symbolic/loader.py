@@ -9,7 +9,10 @@ import sys
 import re
 from importlib.machinery import SourceFileLoader
 
+from symbolic.branch_sites import EXIT_KEYWORDS, isInstrumentation
 from symbolic.invocation import FunctionInvocation
+from symbolic.function_summaries import FunctionSummaries
+from symbolic.state_merging import MergingLoader
 from symbolic.symbolic_types import SymbolicType, SymbolicInteger, getSymbolic, SymbolicStr
 
 # The built-in definition of len wraps the return value in an int() constructor, destroying any symbolic types.
@@ -23,10 +26,8 @@ builtins.hash = (lambda x: x.__hash__())
 sys.old_exit = sys.exit
 
 
-def new_exit(status_code):
-    instrumentation_keywords = {"pyexz3.py", "symbolic", "multiprocessing"}
-    frame, filename, linenum, funcname, context, contextline = inspect.stack().pop(1)
-    if any(instrumentation_keyword in filename for instrumentation_keyword in instrumentation_keywords):
+def new_exit(status_code=None):
+    if isInstrumentation(sys._getframe(1).f_code, EXIT_KEYWORDS):
         sys.old_exit(status_code)
     else:
         raise Exception("Program Exit ({})".format(status_code))
@@ -38,8 +39,13 @@ log = logging.getLogger("se.loader")
 
 
 class Loader:
-    def __init__(self, filename, entry):
+    def __init__(self, filename, entry, merge_states=False, function_summaries=False):
         self.app = None
+        # merge small acyclic regions of the target instead of forking on them, see state_merging.py
+        self.merge_states = merge_states
+        self.merged_regions = 0
+        # summaries of the functions of the target called by the entry point, see function_summaries.py
+        self.function_summaries = FunctionSummaries() if function_summaries else None
 
         self.modulename = os.path.basename(filename)
         self.modulename, ext = os.path.splitext(self.modulename)
@@ -61,19 +67,28 @@ class Loader:
         try:
             if modulename in sys.modules:
                 del (sys.modules[modulename])
-            self.app = SourceFileLoader(modulename, self.filename).load_module()
+            module_loader = self._moduleLoader(modulename)
+            self.app = module_loader.load_module()
+            self.merged_regions = getattr(module_loader, "regions", 0)
+            if self.function_summaries is not None:
+                self.function_summaries.instrument(self.app, exclude={self.entrypoint})
         except Exception as arg:
             print("Couldn't import " + modulename)
             print(arg)
             raise ImportError()
 
+    def _moduleLoader(self, modulename):
+        if self.merge_states:
+            return MergingLoader(modulename, self.filename)
+        return SourceFileLoader(modulename, self.filename)
+
     def _initializeArgumentConcrete(self, inv: FunctionInvocation, f, val):
         inv.addArgumentConstructor(f, val, lambda n, v: val)
 
     def _initializeArgumentSymbolic(self, inv: FunctionInvocation, f: str, val, st: SymbolicType):
         inv.addArgumentConstructor(f, val, lambda n, v: st(n, v))
 
-    def execution_complete(self, return_vals):
+    def execution_complete(self, return_vals, counters=None, orders=None):
         print("{}.py execution complete.".format(self.modulename))
 
 
@@ -83,7 +98,7 @@ class MainLoader(Loader):
 
     def _execute(self, **kwargs):
         self.instrument(**kwargs)
-        SourceFileLoader("__main__", self.filename).load_module()
+        self._moduleLoader("__main__").load_module()
 
     def instrument(self, **kwargs: {str: SymbolicStr}):
         raise NotImplementedError
@@ -113,9 +128,9 @@ class SysArgvLoader(MainLoader):
             sys.argv[index] = val
 
 class CLIParseLoader(MainLoader):
-    def __init__(self, filename, entry):
+    def __init__(self, filename, entry, merge_states=False, function_summaries=False):
         self.tracked_inputs = {}
-        super(CLIParseLoader, self).__init__(filename, entry)
+        super(CLIParseLoader, self).__init__(filename, entry, merge_states, function_summaries)
 
     def createInvocation(self):
         inv = FunctionInvocation(self._execute, "main", self._reset)
@@ -135,12 +150,12 @@ class CLIParseLoader(MainLoader):
         self._restore()
 
 class OptParseLoader(CLIParseLoader):
-    def __init__(self, filename, entry):
+    def __init__(self, filename, entry, merge_states=False, function_summaries=False):
         import optparse
         self.optparse = optparse
         self.original_add_option = self.optparse.OptionParser.add_option
         self.original_parse_args = self.optparse.OptionParser.parse_args
-        super(OptParseLoader, self).__init__(filename, entry)
+        super(OptParseLoader, self).__init__(filename, entry, merge_states, function_summaries)
 
     def record(self):
         def new_add_option(optparser_self, *args, **kwargs):
@@ -174,7 +189,7 @@ class OptParseLoader(CLIParseLoader):
         self.optparse.OptionParser.parse_args = self.original_parse_args
 
 class ArgParseLoader(CLIParseLoader):
-    def __init__(self, filename, entry):
+    def __init__(self, filename, entry, merge_states=False, function_summaries=False):
         import argparse
         self.argparse = argparse
         self.original_add_argument = self.argparse.ArgumentParser.add_argument
@@ -182,7 +197,7 @@ class ArgParseLoader(CLIParseLoader):
 
         self.default_func = None
 
-        super(ArgParseLoader, self).__init__(filename, entry)
+        super(ArgParseLoader, self).__init__(filename, entry, merge_states, function_summaries)
 
     def record(self):
         def new_add_argument(argumentparser_self, *args, **kwargs):
@@ -256,7 +271,23 @@ class FunctionLoader(Loader):
             inv.addPrecondition(func.precondition)
         return inv
 
-    def execution_complete(self, return_vals):
+    def execution_complete(self, return_vals, counters=None, orders=None):
+        passed = self._checkResults(return_vals)
+        # merged regions explore other paths, with other counters
+        if counters is not None and self.merged_regions == 0 and "expected_counters" in self.app.__dict__:
+            passed = self._checkCounters(counters, self.app.__dict__["expected_counters"]()) and passed
+        if orders is not None and self.merged_regions == 0 and "expected_first_results" in self.app.__dict__:
+            passed = self._checkFirstResults(return_vals, orders, self.app.__dict__["expected_first_results"]()) \
+                and passed
+        return passed
+
+    def _checkResults(self, return_vals):
+        # merged regions return an ite instead of forking, so some paths, and their results, are not explored
+        if self.merged_regions > 0:
+            if "expected_merged_result" in self.app.__dict__:
+                return self._check(return_vals, self.app.__dict__["expected_merged_result"]())
+            if "expected_merged_result_set" in self.app.__dict__:
+                return self._check(return_vals, self.app.__dict__["expected_merged_result_set"](), False)
         if "expected_result" in self.app.__dict__:
             return self._check(return_vals, self.app.__dict__["expected_result"]())
         if "expected_result_set" in self.app.__dict__:
@@ -285,6 +316,31 @@ class FunctionLoader(Loader):
             print("%s test passed <---" % self.modulename)
             return True
 
+    def _checkCounters(self, counters, minimums):
+        """The counters of the features enabled in the run must reach the minimums of expected_counters; those of
+        the features not enabled are not checked."""
+        low = {name: counters[name] for name, minimum in minimums.items()
+               if name in counters and counters[name] < minimum}
+        if len(low) > 0:
+            print("-------------------> %s test failed <---------------------" % self.modulename)
+            print("Expected counters: %s, found: %s" % ({name: minimums[name] for name in low}, low))
+            return False
+        return True
+
+    def _checkFirstResults(self, computed, orders, expected):
+        """When the run changes one of its orders of exploration (search strategy, frontier order) from depth_first,
+        the return values must start with those that expected_first_results gives for that order. The frontier order
+        only breaks the ties of the search strategy, so the values are not checked when both are changed."""
+        changed = [order for order in orders if order != "depth_first"]
+        if len(changed) != 1 or changed[0] not in expected:
+            return True
+        first = expected[changed[0]]
+        if list(computed[:len(first)]) != list(first):
+            print("-------------------> %s test failed <---------------------" % self.modulename)
+            print("Expected with %s: %s first, found: %s" % (changed[0], first, computed[:len(first)]))
+            return False
+        return True
+
     def _reset(self, firstpass=False, modulename=None):
         super()._reset(firstpass)
         if not self.entrypoint in self.app.__dict__ or not callable(self.app.__dict__[self.entrypoint]):
@@ -295,7 +351,7 @@ class FunctionLoader(Loader):
         return self.app.__dict__[self.entrypoint](**kwargs)
 
 
-def loaderFactory(filename, entry, loader=None):
+def loaderFactory(filename, entry, loader=None, merge_states=False, function_summaries=False):
     if not os.path.isfile(filename):
         print("Please provide a Python file to load")
         return None
@@ -304,7 +360,7 @@ def loaderFactory(filename, entry, loader=None):
         sys.path = [directory] + sys.path
         loader_map = {'argparse': ArgParseLoader, 'sysargv': SysArgvLoader, 'optparse': OptParseLoader}
         loader_class = loader_map.get(loader, FunctionLoader)
-        ret = loader_class(filename, entry)
+        ret = loader_class(filename, entry, merge_states, function_summaries)
         return ret
     except ImportError:
         sys.path = sys.path[1:]
@@ -0,0 +1,134 @@
+# Copyright: see copyright.txt
+
+import logging
+
+from .predicate import Predicate
+from .symbolic_types.symbolic_int import SymbolicInteger
+from .symbolic_types.symbolic_type import SymbolicType
+
+log = logging.getLogger("se.loops")
+
+MIN_ITERATIONS = 3
+COMPARISONS = {"<", "<=", ">", ">="}
+AFFINE_OPS = {"+", "-", "*"}
+TRIP_COUNT = "__trip{}"
+
+
+def summarizeLoops(constraint):
+    """Returns the asserts of the query of the constraint, as Constraint.getAssertsAndQuery, with the iterations of
+    counted loops replaced by a summary, or None if the path has no loop to summarize.
+
+    A loop shows up on the path as predicates of the same branch site that only differ by an integer constant
+    growing by the same step d at each iteration, e.g. 1 <= x, 2 <= x, ... for a concrete induction variable. When
+    the guard held for the first n occurrences and failed at the last one, the occurrences are replaced by
+    guard(c0), guard(c0 + (N - 1) * d) and not guard(c0 + N * d) for a fresh trip count N >= 1. The guard is a
+    comparison that is affine in the constant, so holding at both ends means holding for every iteration in
+    between, and one query reaches the code after the loop for any number of iterations."""
+    path = []  # (branch site, predicate), root first
+    node = constraint.parent
+    while node.predicate is not None:
+        path.append((_site(node.branch_id), node.predicate))
+        node = node.parent
+    path.reverse()
+
+    groups = {}  # {(branch site, template): [(position, constants, affine)]}
+    for position, (site, predicate) in enumerate(path):
+        template = _template(predicate)
+        if template is not None:
+            shape, constants, affine = template
+            groups.setdefault((site, shape), []).append((position, constants, affine))
+
+    replaced = {}  # {position: predicates asserted instead of the predicate at the position}
+    loops = 0
+    for occurrences in groups.values():
+        summary = _summarize([path[position][1] for position, _, _ in occurrences], occurrences,
+                             TRIP_COUNT.format(loops))
+        if summary is None:
+            continue
+        loops += 1
+        for position, _, _ in occurrences[1:-1]:
+            replaced[position] = []
+        replaced[occurrences[-1][0]] = summary
+    if len(replaced) == 0:
+        return None
+
+    asserts = []
+    for position, (site, predicate) in enumerate(path):
+        asserts.extend(replaced.get(position, [predicate]))
+    asserts.reverse()
+    return asserts
+
+
+def _summarize(predicates, occurrences, trip_count):
+    """The predicates replacing the last occurrence of a loop guard, None if the occurrences are not a counted
+    loop that exited."""
+    if len(occurrences) < MIN_ITERATIONS or predicates[-1].result or not all(p.result for p in predicates[:-1]):
+        return None
+    constants = [c for _, c, _ in occurrences]
+    varying = [i for i in range(len(constants[0])) if len({c[i] for c in constants}) > 1]
+    if len(varying) != 1 or not occurrences[0][2][varying[0]]:
+        return None
+    index = varying[0]
+    start = constants[0][index]
+    step = constants[1][index] - start
+    if any(c[index] != start + k * step for k, c in enumerate(constants)):
+        return None
+
+    trips = SymbolicInteger(trip_count, len(occurrences) - 1)
+    guard = predicates[0].symtype
+    log.debug("Summarized loop guard {} over {} iterations".format(guard.toString(), len(occurrences)))
+    return [Predicate(SymbolicInteger("se", 1, [">=", trips, 1]), True),
+            Predicate(_instantiate(guard, index, ["+", start - step, ["*", trips, step]]), True),
+            Predicate(_instantiate(guard, index, ["+", start, ["*", trips, step]]), False)]
+
+
+def _site(branch_id):
+    """The source location of a branch, without the direction taken."""
+    return branch_id.site if branch_id is not None else None
+
+
+def _template(predicate):
+    """Returns the shape of the predicate without its integer constants, the constants in depth-first order and
+    whether the comparison is affine in each of them. None for predicates that are not integer comparisons."""
+    symtype = predicate.symtype
+    if not isinstance(symtype, SymbolicInteger) or symtype.isVariable() or symtype.expr[0] not in COMPARISONS:
+        return None
+    constants = []
+    affine = []
+
+    def walk(expr, is_affine):
+        if isinstance(expr, list):
+            inner = is_affine and expr[0] in AFFINE_OPS
+            return (expr[0],) + tuple(walk(e, inner) for e in expr[1:])
+        elif isinstance(expr, SymbolicType):
+            if expr.isVariable():
+                return "var", expr.name
+            return walk(expr.expr, is_affine)
+        elif isinstance(expr, int) and not isinstance(expr, bool):
+            constants.append(expr)
+            affine.append(is_affine)
+            return "int",
+        return type(expr).__name__, expr
+
+    expr = symtype.expr
+    shape = (expr[0],) + tuple(walk(e, True) for e in expr[1:])
+    return shape, tuple(constants), affine
+
+
+def _instantiate(guard, index, replacement):
+    """The guard with its index-th integer constant (in the order of _template) replaced by an expression."""
+    position = [0]
+
+    def walk(expr):
+        if isinstance(expr, list):
+            return [expr[0]] + [walk(e) for e in expr[1:]]
+        elif isinstance(expr, SymbolicType):
+            if expr.isVariable():
+                return expr
+            return walk(expr.expr)
+        elif isinstance(expr, int) and not isinstance(expr, bool):
+            position[0] += 1
+            return replacement if position[0] - 1 == index else expr
+        return expr
+
+    return SymbolicInteger("se", 0, walk(guard.expr))
@@ -11,10 +11,10 @@ log = logging.getLogger("se.pathconstraint")
 
 class PathToConstraint:
     def __init__(self, add, name):
-        self.constraints = {}
         self.add = add
         self.name = name
         self.root_constraint = Constraint(None, None)
+        self.constraints = self.root_constraint.index  # {id: Constraint}, maintained by Constraint.addChild
         self.current_constraint = self.root_constraint
         self.expected_path = None
 
@@ -29,9 +29,10 @@ class PathToConstraint:
                 self.expected_path.append(tmp.predicate)
                 tmp = tmp.parent
 
-    def whichBranch(self, branch, symbolic_type):
+    def whichBranch(self, branch, symbolic_type, branch_id=None):
         """ This function acts as instrumentation.
-        Branch can be either True or False."""
+        Branch can be either True or False. The branch_id of a new constraint is computed from the
+        stack unless given, as when replaying the branches of an execution in another process."""
 
         # add both possible predicate outcomes to constraint (tree)
         p = Predicate(symbolic_type, branch)
@@ -41,7 +42,7 @@ class PathToConstraint:
         c = self.current_constraint.findChild(p)
 
         if c is None:
-            c = self.current_constraint.addChild(p)
+            c = self.current_constraint.addChild(p, branch_id)
 
             # we add the new constraint to the queue of the engine for later processing
             self.add(c)
@@ -68,17 +69,7 @@ class PathToConstraint:
         self.current_constraint = c
 
     def find_constraint(self, id):
-        return self._find_constraint(self.root_constraint, id)
-
-    def _find_constraint(self, constraint, id):
-        if constraint.id == id:
-            return constraint
-        else:
-            for child in constraint.children:
-                found = self._find_constraint(child, id)
-                if found is not None:
-                    return found
-        return None
+        return self.constraints.get(id)
 
     def toDot(self):
         # print the thing into DOT format
@@ -105,7 +96,18 @@ class PathToConstraint:
         return header + dotbody + footer
 
     def __getstate__(self):
-        return {k: v for k,v in self.__dict__.items() if k != "add"}
+        return {k: v for k,v in self.__dict__.items() if k not in ("add", "constraints")}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # rebuild the id index that Constraint does not serialize
+        self.constraints = {}
+        constraints = [self.root_constraint]
+        while len(constraints) > 0:
+            c = constraints.pop()
+            c.index = self.constraints
+            self.constraints[c.id] = c
+            constraints += c.children
 
     def __getnewargs__(self):
         return ("","","")
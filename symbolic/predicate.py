@@ -12,6 +12,16 @@ class Predicate:
     def getVars(self):
         return self.symtype.getVars()
 
+    def key(self):
+        return self.result, self.symtype.structuralKey()
+
+    def identity(self):
+        """Like key, equal for equal predicates, but hashed in O(1): the hash-consed term of the expression stands
+        for its structure."""
+        if self.symtype.isVariable():
+            return self.result, self.symtype.name
+        return self.result, self.symtype.expr
+
     def __eq__(self, other):
         if isinstance(other, Predicate):
             res = self.result == other.result and self.symtype.symbolicEq(other.symtype)
@@ -20,7 +30,7 @@ class Predicate:
             return False
 
     def __hash__(self):
-        return hash(self.symtype)
+        return hash(self.identity())
 
     def __str__(self):
         return self.symtype.toString() + " (%s)" % (self.result)
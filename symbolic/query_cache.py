@@ -0,0 +1,135 @@
+# Copyright: see copyright.txt
+
+import logging
+import pickle
+import sqlite3
+from collections import OrderedDict
+from hashlib import sha224
+
+log = logging.getLogger("se.cache")
+
+
+class QueryCache:
+    """Remembers the SAT models and UNSAT verdicts of solved queries, so a query that is built again (sibling
+    paths sharing a prefix, replays that diverged) is answered without a solver. Queries are keyed by their
+    structure: the set of asserted predicates and the query predicate. UNKNOWN answers depend on the timeout
+    and are not cached. The least recently used entries are evicted beyond size entries; a size of 0 disables the
+    cache.
+
+    With a store file, answers are also kept in an sqlite database, whatever the size that outlives the run and can be shared by
+    concurrent runs. Stored queries are alpha-normalized, so queries that only differ in the names of their
+    variables share an entry."""
+
+    def __init__(self, size=0, store=None):
+        self.size = size
+        self.entries = OrderedDict()  # {key: (result, model)}
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.db = None
+        if store is not None:
+            self.db = sqlite3.connect(store, timeout=60)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS queries "
+                            "(digest TEXT PRIMARY KEY, result TEXT, model BLOB, solving_time REAL)")
+            self.db.commit()
+
+    @staticmethod
+    def key(asserts, query):
+        return frozenset(p.key() for p in asserts), query.key()
+
+    @staticmethod
+    def _normalize(key):
+        """Returns the digest of the alpha-normalized query and the {variable: normalized name} renaming. The
+        digest depends neither on the names of the variables nor on the iteration order of the set of asserts.
+
+        Variables are told apart by color refinement: a variable starts with one color, and its next color
+        combines its color with the predicates it occurs in (written with the colors of their variables) and its
+        positions in them, until the number of colors stops growing. Variables are then numbered by color, then by
+        first occurrence in the colored predicates. Variables that keep the same color are interchangeable in
+        practice, so the numbering among them does not change the digest."""
+        asserts, query = key
+        predicates = sorted(asserts, key=repr) + [("query", query)]  # the initial order does not matter
+        variables = {}  # {name: occurrences [(predicate index, position)]}
+
+        def occurrences(k, index, found):
+            if isinstance(k, tuple) and len(k) == 3 and k[0] == "var":
+                variables.setdefault(k[2], []).append((index, len(found)))
+                found.append(k[2])
+            elif isinstance(k, tuple):
+                for e in k:
+                    occurrences(e, index, found)
+
+        def substitute(k, mapping):
+            if isinstance(k, tuple) and len(k) == 3 and k[0] == "var":
+                return k[:2] + (mapping[k[2]],)
+            return tuple(substitute(e, mapping) for e in k) if isinstance(k, tuple) else k
+
+        for index, k in enumerate(predicates):
+            occurrences(k, index, [])
+        colors = {name: 0 for name in variables}
+        while True:
+            colored = [repr(substitute(k, colors)) for k in predicates]
+            signatures = {name: (colors[name], tuple(sorted((colored[index], position)
+                                                            for index, position in found)))
+                          for name, found in variables.items()}
+            ranks = {signature: rank for rank, signature in enumerate(sorted(set(signatures.values())))}
+            refined = {name: ranks[signature] for name, signature in signatures.items()}
+            if len(ranks) == len(set(colors.values())):
+                break
+            colors = refined
+
+        colored = [repr(substitute(k, colors)) for k in predicates]
+        first = {name: min((colored[index], position) for index, position in found)
+                 for name, found in variables.items()}
+        names = {name: "v{}".format(number) for number, name in
+                 enumerate(sorted(variables, key=lambda name: (colors[name], first[name])))}
+        text = repr((tuple(sorted(repr(substitute(k, names)) for k in asserts)), substitute(query, names)))
+        return sha224(text.encode("utf-8")).hexdigest(), names
+
+    def get(self, key):
+        """Returns (result, model) of the cached query, None if the query has not been solved."""
+        if self.size <= 0 and self.db is None:
+            return None
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            result, model = self.entries[key]
+            return result, None if model is None else dict(model)
+        if self.db is not None:
+            digest, names = QueryCache._normalize(key)
+            row = self.db.execute("SELECT result, model FROM queries WHERE digest = ?", (digest,)).fetchone()
+            if row is not None:
+                self.hits += 1
+                self.store_hits += 1
+                result, model = row[0], pickle.loads(row[1])
+                if model is not None:
+                    originals = {normalized: name for name, normalized in names.items()}
+                    model = {originals[name]: value for name, value in model.items() if name in originals}
+                self._remember(key, result, model)
+                return result, None if model is None else dict(model)
+        self.misses += 1
+        return None
+
+    def put(self, key, result, model, solving_time=0):
+        if self.size <= 0 and self.db is None or result not in ("SAT", "UNSAT"):
+            return
+        self._remember(key, result, model)
+        if self.db is not None:
+            digest, names = QueryCache._normalize(key)
+            if model is not None:
+                model = {names[name]: value for name, value in model.items() if name in names}
+            self.db.execute("INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?)",
+                            (digest, result, pickle.dumps(model), solving_time))
+            self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def _remember(self, key, result, model):
+        self.entries[key] = (result, None if model is None else dict(model))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
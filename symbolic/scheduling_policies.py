@@ -4,7 +4,16 @@ from random import randint
 
 SHORT_TIMEOUT_THRESHOLD = 1
 
-def central_queue(worker_pool: dict, timeouts: list, selected_timeout: float or int):
+# A policy picks the worker for a query, or None to keep the query queued. affinity, when given, lists the workers
+# that already hold a part of the query (incremental solving), best first. predicted, when given, is the solve time
+# of the query in seconds predicted from its features (see hardness.HardnessModel). A policy with per_constraint set
+# decides on more than the timeout, so every queued constraint is offered to it, not only the first of each timeout.
+
+def central_queue(worker_pool: dict, timeouts: list, selected_timeout: float or int, affinity: list = None,
+                  predicted: float = None):
+    for worker_id in affinity or []:
+        if worker_id in worker_pool and worker_pool[worker_id] is None:
+            return worker_id
     for worker_id, worker in worker_pool.items():
         if worker is None:
             return worker_id
@@ -12,25 +21,42 @@ def central_queue(worker_pool: dict, timeouts: list, selected_timeout: float or
         return None
 
 
-def tags(worker_pool: dict, timeouts: list, selected_timeout: float or int):
+def tags(worker_pool: dict, timeouts: list, selected_timeout: float or int, affinity: list = None,
+         predicted: float = None):
     timeout_idx = timeouts.index(selected_timeout) + 1
     if timeout_idx > len(worker_pool):
         timeout_idx = len(worker_pool)
     return timeout_idx if worker_pool[timeout_idx] is None else None
 
 
-def express_checkout(worker_pool: dict, timeouts: list, selected_timeout: float or int):
+def express_checkout(worker_pool: dict, timeouts: list, selected_timeout: float or int, affinity: list = None,
+                     predicted: float = None):
     if selected_timeout < SHORT_TIMEOUT_THRESHOLD:
         return 1 if worker_pool[1] is None else None
     else:
         return central_queue({worker_id: worker for worker_id, worker in worker_pool.items() if worker_id > 1},
-                             timeouts, selected_timeout)
+                             timeouts, selected_timeout, affinity, predicted)
 
-def preemptive(worker_pool: dict, timeouts: list, selected_timeout: float or int):
-    free_slot = central_queue(worker_pool, timeouts, selected_timeout)
+def preemptive(worker_pool: dict, timeouts: list, selected_timeout: float or int, affinity: list = None,
+               predicted: float = None):
+    free_slot = central_queue(worker_pool, timeouts, selected_timeout, affinity, predicted)
     if free_slot is not None:
         return free_slot
     if selected_timeout < SHORT_TIMEOUT_THRESHOLD:
         return randint(1, len(worker_pool))
     else:
         return None
+
+
+def shortest_job_first(worker_pool: dict, timeouts: list, selected_timeout: float or int, affinity: list = None,
+                       predicted: float = None):
+    """Like express_checkout, but on the predicted solve time: worker 1 is kept for the queries predicted to be
+    short, so they do not wait behind hard ones. Without a prediction yet, the timeout is used."""
+    expected = predicted if predicted is not None else selected_timeout
+    if expected < SHORT_TIMEOUT_THRESHOLD or len(worker_pool) == 1:
+        return central_queue(worker_pool, timeouts, selected_timeout, affinity, predicted)
+    return central_queue({worker_id: worker for worker_id, worker in worker_pool.items() if worker_id > 1},
+                         timeouts, selected_timeout, affinity, predicted)
+
+
+shortest_job_first.per_constraint = True
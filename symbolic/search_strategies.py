@@ -0,0 +1,84 @@
+# Copyright: see copyright.txt
+
+from collections import defaultdict
+
+from coverage.parser import PythonParser
+
+# A search strategy orders the queued constraints of the same solving timeout: it maps a constraint to a key and
+# smaller keys are solved first. Constraints with equal keys are solved in the frontier order (see frontier.py).
+# Strategies get the ExplorationEngine for the state of the exploration; a strategy with rescore set has its keys
+# recomputed when a constraint is dequeued, as they change while the exploration goes on.
+
+
+def depth_first(constraint, exploration):
+    return 0
+
+
+def generational(constraint, exploration):
+    """SAGE-style generational search: the branches of one execution are solved as a batch, and the executions
+    that increased coverage the most are expanded first."""
+    return -constraint.coverage_gain, constraint.generation
+
+
+def coverage_novelty(constraint, exploration):
+    """Prefers branch sites from which many arcs no execution has covered yet are reachable, then sites closer to
+    uncovered code, then sites that produced fewer constraints so far."""
+    site = _branchSite(constraint.branch_id)
+    if site is None:
+        return 0, float("inf"), 0
+    hits = exploration.site_hits.get(constraint.branch_id, 0)
+    cached = exploration.search_cache.get(site)
+    if cached is None or cached[0] != exploration.generation:
+        cached = exploration.generation, _uncoveredReachable(exploration, *site)
+        exploration.search_cache[site] = cached
+    uncovered, distance = cached[1]
+    return -uncovered, distance, hits
+
+
+coverage_novelty.rescore = True
+
+
+def shortest_job_first(constraint, exploration):
+    """Solves the queries with the shortest predicted solve time first (see hardness.HardnessModel)."""
+    predicted = exploration.hardness.predict(constraint.features)
+    return predicted if predicted is not None else 0.0
+
+
+shortest_job_first.rescore = True
+
+
+def _branchSite(branch_id):
+    return branch_id.site if branch_id is not None else None
+
+
+def _uncoveredReachable(exploration, filename, line):
+    """The number of uncovered arcs reachable from the line and the number of arcs to the nearest one."""
+    graph = exploration.search_cache.get(filename)
+    if graph is None:
+        graph = defaultdict(list)  # {line: [successor line]}, exits are negative
+        try:
+            parser = PythonParser(filename=filename)
+            parser.parse_source()
+            for origin, destination in parser.arcs():
+                graph[origin].append(destination)
+        except Exception:
+            pass
+        exploration.search_cache[filename] = graph
+    covered = set(exploration.global_execution_coverage.arcs(filename) or ())
+    uncovered, distance = 0, float("inf")
+    seen = {line}
+    frontier = [line]
+    depth = 0
+    while len(frontier) > 0:
+        successors = []
+        for origin in frontier:
+            for destination in graph.get(origin, ()):
+                if (origin, destination) not in covered:
+                    uncovered += 1
+                    distance = min(distance, depth)
+                if destination > 0 and destination not in seen:
+                    seen.add(destination)
+                    successors.append(destination)
+        frontier = successors
+        depth += 1
+    return uncovered, distance
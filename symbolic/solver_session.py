@@ -0,0 +1,42 @@
+# Copyright: see copyright.txt
+
+import logging
+
+log = logging.getLogger("se.session")
+
+
+class SolverSession:
+    """Tracks the path predicates asserted in an incremental solver, one push per predicate. Queries along the
+    same path share their asserts from the root down, so the next query only pops the predicates it does not
+    share and asserts the rest instead of translating the whole path again. assert_predicate gets the predicate
+    and its level, i.e. its position counted from the root."""
+
+    def __init__(self, push, pop, assert_predicate):
+        self.push = push
+        self.pop = pop
+        self.assert_predicate = assert_predicate
+        self.prefix = []  # Predicate.key() of the asserted predicates, root first
+        self.reused = 0
+        self.asserted = 0
+
+    def assertPrefix(self, asserts):
+        """Makes the solver hold exactly the asserts, given as returned by Constraint.getAssertsAndQuery."""
+        asserts = list(reversed(asserts))
+        keys = [p.key() for p in asserts]
+        common = 0
+        while common < len(self.prefix) and common < len(keys) and self.prefix[common] == keys[common]:
+            common += 1
+        if len(self.prefix) > common:
+            self.pop(len(self.prefix) - common)
+            del self.prefix[common:]
+        for predicate, key in zip(asserts[common:], keys[common:]):
+            self.push()
+            try:
+                self.assert_predicate(predicate, len(self.prefix))
+            except Exception:
+                self.pop(1)
+                raise
+            self.prefix.append(key)
+        self.reused += common
+        self.asserted += len(asserts) - common
+        log.debug("Reused {} of {} asserts".format(common, len(asserts)))
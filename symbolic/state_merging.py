@@ -0,0 +1,226 @@
+# Copyright: see copyright.txt
+
+import ast
+import copy
+import logging
+from importlib.machinery import SourceFileLoader
+
+from .symbolic_types.symbolic_int import SymbolicInteger
+from .symbolic_types.symbolic_type import SymbolicType
+
+log = logging.getLogger("se.merging")
+
+MAX_REGION_STATEMENTS = 8
+PREFIX = "_se_"  # not __, which Python mangles inside classes
+PURE_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.BitAnd, ast.BitOr, ast.BitXor, ast.USub, ast.UAdd, ast.Invert,
+                  ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+
+def _integer(value):
+    return isinstance(value, int) and (not isinstance(value, SymbolicType) or isinstance(value, SymbolicInteger))
+
+
+def integers(*values):
+    """Whether the values are all integers, symbolic or not: the arms of a merged region are only computed then."""
+    return all(_integer(v) for v in values)
+
+
+def ite(condition, then_value, else_value):
+    """then_value if condition else else_value. A symbolic integer condition does not fork the path: the result is
+    the symbolic expression ["ite", condition, then_value, else_value]. Other values fall back to a fork."""
+    if not isinstance(condition, SymbolicType):
+        return then_value if condition else else_value
+    if then_value is else_value:
+        return then_value
+    if not isinstance(condition, SymbolicInteger) or not integers(then_value, else_value):
+        return then_value if condition else else_value
+    unwrapped = [v.unwrap() if isinstance(v, SymbolicType) else (v, v) for v in (condition, then_value, else_value)]
+    concrete = unwrapped[1][0] if unwrapped[0][0] else unwrapped[2][0]
+    return SymbolicInteger("se", concrete, ["ite"] + [s for c, s in unwrapped])
+
+
+class StateMerger(ast.NodeTransformer):
+    """Rewrites small acyclic regions of the functions of a module so that they do not fork. A region is an if
+    statement whose arms only assign pure expressions (names, integer constants, arithmetic and single comparisons,
+    nothing that could raise or branch) to local variables:
+
+        if x > 0:
+            y = y + 1
+        else:
+            y = 0
+
+    becomes
+
+        if _se_integers(x, y):
+            _se_c0 = x > 0
+            _se_t0_y = y + 1
+            _se_e0_y = 0
+            y = _se_ite(_se_c0, _se_t0_y, _se_e0_y)
+        else:
+            <the if statement>
+
+    Both arms are computed on every execution, so the region is only merged when the variables it reads hold
+    integers, symbolic or not, on which the arms cannot raise; otherwise the if statement runs as written. A
+    variable assigned in one arm only keeps its value in the other, so it must be defined before the region."""
+
+    def __init__(self):
+        self.regions = 0
+
+    def visit_FunctionDef(self, node):
+        defined = {a.arg for a in node.args.args + node.args.kwonlyargs}
+        defined |= {a.arg for a in (node.args.vararg, node.args.kwarg) if a is not None}
+        node.body = self._block(node.body, defined)
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def _block(self, statements, defined):
+        """The statements with their regions merged; defined is the set of the local variables assigned before."""
+        defined = set(defined)
+        rewritten = []
+        for statement in statements:
+            if isinstance(statement, ast.If) and self._mergeable(statement, defined):
+                rewritten.extend(self._merge(statement))
+            elif isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                # a new scope
+                rewritten.append(self.visit(statement))
+            else:
+                for field in ("body", "orelse", "finalbody"):
+                    if isinstance(getattr(statement, field, None), list):
+                        setattr(statement, field, self._block(getattr(statement, field), defined))
+                for handler in getattr(statement, "handlers", []):
+                    handler.body = self._block(handler.body, defined)
+                rewritten.append(statement)
+            if isinstance(statement, (ast.Assign, ast.AugAssign, ast.If)):
+                defined |= StateMerger._assigned(statement)
+        return rewritten
+
+    @staticmethod
+    def _assigned(statement):
+        """The local variables certainly assigned by the statement."""
+        if isinstance(statement, ast.Assign):
+            return {t.id for t in statement.targets if isinstance(t, ast.Name)}
+        if isinstance(statement, ast.AugAssign) and isinstance(statement.target, ast.Name):
+            return {statement.target.id}
+        if isinstance(statement, ast.If) and len(statement.orelse) > 0:
+            then_names = set().union(*[StateMerger._assigned(s) for s in statement.body])
+            else_names = set().union(*[StateMerger._assigned(s) for s in statement.orelse])
+            return then_names & else_names
+        return set()
+
+    def _mergeable(self, statement, defined):
+        arms = [statement.body, statement.orelse]
+        if not StateMerger._pure(statement.test) or len(statement.body) + len(statement.orelse) > MAX_REGION_STATEMENTS:
+            return False
+        for arm in arms:
+            assigned = set()
+            for s in arm:
+                if isinstance(s, ast.Assign) and len(s.targets) == 1 and isinstance(s.targets[0], ast.Name):
+                    target, value = s.targets[0].id, s.value
+                elif isinstance(s, ast.AugAssign) and isinstance(s.target, ast.Name) and \
+                        isinstance(s.op, PURE_OPERATORS):
+                    target, value = s.target.id, s.value
+                    if target not in defined and target not in assigned:
+                        return False
+                else:
+                    return False
+                if not StateMerger._pure(value) or target.startswith(PREFIX):
+                    return False
+                if any(n.id not in defined and n.id not in assigned for n in ast.walk(value) if isinstance(n, ast.Name)):
+                    return False
+                assigned.add(target)
+        then_names = set().union(*[StateMerger._assigned(s) for s in statement.body])
+        else_names = set().union(*[StateMerger._assigned(s) for s in statement.orelse])
+        return all(name in defined for name in then_names ^ else_names) and len(then_names | else_names) > 0
+
+    @staticmethod
+    def _pure(expr):
+        """Whether computing the expression on integers can neither raise nor branch on a symbolic value; whether
+        its names hold integers is checked when the region runs."""
+        for node in ast.walk(expr):
+            if isinstance(node, ast.Compare) and len(node.ops) != 1:
+                return False
+            if isinstance(node, ast.Constant) and not isinstance(node.value, int):
+                return False
+            if not isinstance(node, (ast.Name, ast.Load, ast.Constant, ast.BinOp, ast.UnaryOp, ast.Compare) +
+                              PURE_OPERATORS):
+                return False
+        return True
+
+    def _merge(self, statement):
+        region = self.regions
+        self.regions += 1
+        condition = "{}c{}".format(PREFIX, region)
+        merged = [ast.copy_location(ast.Assign(targets=[ast.Name(id=condition, ctx=ast.Store())],
+                                               value=copy.deepcopy(statement.test)), statement)]
+        read = {n.id for n in ast.walk(statement.test) if isinstance(n, ast.Name)}
+        arms = []
+        for arm, tag in ((statement.body, "t"), (statement.orelse, "e")):
+            renamed = {}  # {variable: temporary holding its value in the arm}
+            for s in arm:
+                read |= {n.id for n in ast.walk(s.value) if isinstance(n, ast.Name) and n.id not in renamed}
+                value = _Rename(renamed).visit(copy.deepcopy(s.value))
+                target = s.targets[0].id if isinstance(s, ast.Assign) else s.target.id
+                if isinstance(s, ast.AugAssign):
+                    if target not in renamed:
+                        read.add(target)
+                    value = ast.BinOp(left=ast.Name(id=renamed.get(target, target), ctx=ast.Load()), op=s.op,
+                                      right=value)
+                renamed[target] = "{}{}{}_{}".format(PREFIX, tag, region, target)
+                # the arm keeps the line of its statement, which is covered whenever the region runs
+                merged.append(ast.copy_location(ast.Assign(targets=[ast.Name(id=renamed[target], ctx=ast.Store())],
+                                                           value=value), s))
+            arms.append(renamed)
+        for name in sorted(set(arms[0]) | set(arms[1])):
+            merged.append(ast.copy_location(ast.Assign(
+                targets=[ast.Name(id=name, ctx=ast.Store())],
+                value=ast.Call(func=ast.Name(id=PREFIX + "ite", ctx=ast.Load()),
+                               args=[ast.Name(id=condition, ctx=ast.Load())] +
+                                    [ast.Name(id=arm.get(name, name), ctx=ast.Load()) for arm in arms],
+                               keywords=[])), statement))
+        guard = ast.Call(func=ast.Name(id=PREFIX + "integers", ctx=ast.Load()),
+                         args=[ast.Name(id=name, ctx=ast.Load()) for name in sorted(read)], keywords=[])
+        return [ast.copy_location(ast.If(test=guard, body=merged, orelse=[statement]), statement)]
+
+
+class _Rename(ast.NodeTransformer):
+    def __init__(self, renamed):
+        self.renamed = renamed
+
+    def visit_Name(self, node):
+        if node.id in self.renamed:
+            return ast.copy_location(ast.Name(id=self.renamed[node.id], ctx=node.ctx), node)
+        return node
+
+
+class MergingLoader(SourceFileLoader):
+    """Loads a module with the regions of its functions merged by StateMerger. The target is loaded again for every
+    execution, so the rewritten code is compiled once per source and kept in memory; it is never written to the
+    bytecode cache. The module gets the ite and integers functions that the merged regions call in its globals."""
+
+    compiled = {}  # {(path, source): (code object, number of merged regions)}
+
+    def __init__(self, fullname, path):
+        SourceFileLoader.__init__(self, fullname, path)
+        self.regions = 0  # merged in the module loaded last
+
+    def exec_module(self, module):
+        module.__dict__[PREFIX + "ite"] = ite
+        module.__dict__[PREFIX + "integers"] = integers
+        SourceFileLoader.exec_module(self, module)
+
+    def get_code(self, fullname):
+        path = self.get_filename(fullname)
+        return self.source_to_code(self.get_data(path), path)
+
+    def source_to_code(self, data, path, *, _optimize=-1):
+        key = path, data
+        if key not in MergingLoader.compiled:
+            tree = ast.parse(data, filename=path)
+            merger = StateMerger()
+            tree = ast.fix_missing_locations(merger.visit(tree))
+            log.info("Merged {} regions of {}".format(merger.regions, path))
+            code = compile(tree, path, "exec", dont_inherit=True, optimize=_optimize)
+            MergingLoader.compiled[key] = code, merger.regions
+        code, self.regions = MergingLoader.compiled[key]
+        return code
@@ -1,6 +1,6 @@
 # Copyright: copyright.txt
 
-from .symbolic_type import SymbolicObject
+from .symbolic_type import SymbolicObject, makeOperators
 
 
 # we use multiple inheritance to achieve concrete execution for any
@@ -30,9 +30,6 @@ class SymbolicInteger(SymbolicObject, int):
     def __hash__(self):
         return self
 
-    def _op_worker(self, args, fun, op):
-        return self._do_sexpr(args, fun, op, SymbolicInteger.wrap)
-
 
 # now update the SymbolicInteger class for operations we
 # will build symbolic terms for
@@ -48,17 +45,4 @@ ops = [("add", "+"),
        ("lshift", "<<"),
        ("rshift", ">>")]
 
-
-def make_method(method, op, a):
-    code = "def %s(self,other):\n" % method
-    code += "   return self._op_worker(%s,lambda x,y : x %s y, \"%s\")" % (a, op, op)
-    locals_dict = {}
-    exec(code, globals(), locals_dict)
-    setattr(SymbolicInteger, method, locals_dict[method])
-
-
-for (name, op) in ops:
-    method = "__%s__" % name
-    make_method(method, op, "[self,other]")
-    rmethod = "__r%s__" % name
-    make_method(rmethod, op, "[other,self]")
+makeOperators(SymbolicInteger, ops, SymbolicInteger.wrap)
@@ -1,4 +1,4 @@
-from .symbolic_type import SymbolicObject
+from .symbolic_type import SymbolicObject, makeOperators
 from symbolic.symbolic_types.symbolic_int import SymbolicInteger
 from string import ascii_lowercase, ascii_uppercase, whitespace
 
@@ -29,9 +29,6 @@ class SymbolicStr(SymbolicObject, str):
     def __hash__(self):
         return hash(self.val)
 
-    def _op_worker(self, args, fun, op):
-        return self._do_sexpr(args, fun, op, SymbolicStr.wrap)
-
     def __bool__(self):
         return SymbolicObject.__bool__(self.__len__() != 0)
 
@@ -135,17 +132,4 @@ class SymbolicStr(SymbolicObject, str):
 # Currently only a subset of string operations are supported.
 ops = [("add", "+")]
 
-
-def make_method(method, op, a):
-    code = "def %s(self,other):\n" % method
-    code += "   return self._op_worker(%s,lambda x,y : x %s y, \"%s\")" % (a, op, op)
-    locals_dict = {}
-    exec(code, globals(), locals_dict)
-    setattr(SymbolicStr, method, locals_dict[method])
-
-
-for (name, op) in ops:
-    method = "__%s__" % name
-    make_method(method, op, "[self,other]")
-    rmethod = "__r%s__" % name
-    make_method(rmethod, op, "[other,self]")
+makeOperators(SymbolicStr, ops, SymbolicStr.wrap)
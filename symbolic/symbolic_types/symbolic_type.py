@@ -1,7 +1,9 @@
 # Copyright: see copyright.txt
 
-import inspect
-import functools
+import operator
+
+from . import term
+from .term import Term
 
 
 # the ABSTRACT base class for representing any expression that depends on a symbolic input
@@ -10,7 +12,8 @@ import functools
 class SymbolicType(object):
     def __init__(self, name, expr=None):
         self.name = name
-        self.expr = expr
+        # expressions are hash-consed, see term.py
+        self.expr = Term.of(expr)
         #print("INIT: " + name)
         #print("expr: " + str(expr))
 
@@ -36,45 +39,42 @@ class SymbolicType(object):
     def getVars(self):
         if self.isVariable():
             return [self.name]
-        elif isinstance(self.expr, list):
-            return self._getVarsLeaves(self.expr)
-        else:
-            return []
-
-    def _getVarsLeaves(self, l):
-        if isinstance(l, list):
-            return functools.reduce(lambda a, x: self._getVarsLeaves(x) + a, l, [])
-        elif isinstance(l, SymbolicType):
-            return [l.name]
+        elif isinstance(self.expr, Term):
+            return list(self.expr.variables)
         else:
             return []
 
     # creating the expression tree
     def _do_sexpr(self, args, fun, op, wrap):
-        unwrapped = [(a.unwrap() if isinstance(a, SymbolicType) else (a, a)) for a in args]
-        args = zip(inspect.getargspec(fun).args, [c for (c, s) in unwrapped])
-        concrete = fun(**dict([a for a in args]))
-        symbolic = [op] + [s for c, s in unwrapped]
-        return wrap(concrete, symbolic)
+        """Applies fun to the concrete values of args and wraps the result with the term [op, args]."""
+        concrete = []
+        symbolic = []
+        for a in args:
+            if isinstance(a, SymbolicType):
+                concrete.append(a.getConcrValue())
+                symbolic.append(a if a.expr is None else a.expr)
+            else:
+                concrete.append(a)
+                symbolic.append(a)
+        return wrap(fun(*concrete), Term.make(op, symbolic))
 
     def symbolicEq(self, other):
         if not isinstance(other, SymbolicType):
             return False
         if self.isVariable() or other.isVariable():
             return self.name == other.name
-        return self._eq_worker(self.expr, other.expr)
+        return self.expr == other.expr
 
-    def _eq_worker(self, expr1, expr2):
-        if type(expr1) != type(expr2):
-            return False
-        if isinstance(expr1, list):
-            return len(expr1) == len(expr2) and \
-                   type(expr1[0]) == type(expr2[0]) and \
-                   all([self._eq_worker(x, y) for x, y in zip(expr1[1:], expr2[1:])])
-        elif isinstance(expr1, SymbolicType):
-            return expr1.name == expr2.name
-        else:
-            return expr1 == expr2
+    def structuralKey(self):
+        """A hashable value that is equal for structurally equal expressions, e.g. to recognize the same
+        predicate in different queries."""
+        if self.isVariable():
+            return "var", type(self).__name__, self.name
+        if isinstance(self.expr, Term):
+            return self.expr.key
+        elif isinstance(self.expr, SymbolicType):
+            return self.expr.structuralKey()
+        return type(self.expr).__name__, self.expr
 
     def toString(self):
         if self.isVariable():
@@ -86,11 +86,15 @@ class SymbolicType(object):
         if isinstance(expr, list):
             return "(" + expr[0] + " " + ", ".join([self._toString(a) for a in expr[1:]]) + ")"
         elif isinstance(expr, SymbolicType):
-            return expr.toString()
+            # the variables of a term are leaves without a concrete value, see term.py
+            return expr.name if expr.isVariable() else expr.toString()
         else:
             return str(expr)
 
 
+term.SymbolicType = SymbolicType
+
+
 # this class is also ABSTRACT although __init__.py does
 # initialize wrap to return SymbolicInteger for the 
 # relational comparison operators
@@ -117,24 +121,49 @@ class SymbolicObject(SymbolicType, object):
         return ret
 
     # compute both the symbolic and concrete image of operator
-    def _do_bin_op(self, other, fun, op, wrap):
-        return self._do_sexpr([self, other], fun, op, wrap)
+    def _do_bin_op(self, other, fun, op, wrap, reflected=False):
+        """The fast path of _do_sexpr for [self, other], or [other, self] when reflected."""
+        if isinstance(other, SymbolicType):
+            other_concrete = other.getConcrValue()
+            other_symbolic = other if other.expr is None else other.expr
+        else:
+            other_concrete = other_symbolic = other
+        symbolic = self if self.expr is None else self.expr
+        if reflected:
+            return wrap(fun(other_concrete, self.getConcrValue()), Term.make(op, (other_symbolic, symbolic)))
+        return wrap(fun(self.getConcrValue(), other_concrete), Term.make(op, (symbolic, other_symbolic)))
 
     def __eq__(self, other):
         # TODO: what it self is not symbolic and other is???
-        return self._do_bin_op(other, lambda x, y: x == y, "==", SymbolicObject.wrap)
+        return self._do_bin_op(other, operator.eq, "==", SymbolicObject.wrap)
 
     def __ne__(self, other):
-        return self._do_bin_op(other, lambda x, y: x != y, "!=", SymbolicObject.wrap)
+        return self._do_bin_op(other, operator.ne, "!=", SymbolicObject.wrap)
 
     def __lt__(self, other):
-        return self._do_bin_op(other, lambda x, y: x < y, "<", SymbolicObject.wrap)
+        return self._do_bin_op(other, operator.lt, "<", SymbolicObject.wrap)
 
     def __le__(self, other):
-        return self._do_bin_op(other, lambda x, y: x <= y, "<=", SymbolicObject.wrap)
+        return self._do_bin_op(other, operator.le, "<=", SymbolicObject.wrap)
 
     def __gt__(self, other):
-        return self._do_bin_op(other, lambda x, y: x > y, ">", SymbolicObject.wrap)
+        return self._do_bin_op(other, operator.gt, ">", SymbolicObject.wrap)
 
     def __ge__(self, other):
-        return self._do_bin_op(other, lambda x, y: x >= y, ">=", SymbolicObject.wrap)
+        return self._do_bin_op(other, operator.ge, ">=", SymbolicObject.wrap)
+
+
+def makeOperators(cls, ops, wrap):
+    """Defines the methods __name__ and __rname__ of cls for each (name, op) of ops, computing the concrete result
+    with the function of the operator module and the term [op, left, right]."""
+    for name, op in ops:
+        fun = getattr(operator, name if name not in ("and", "or") else name + "_")
+        setattr(cls, "__%s__" % name, _binaryMethod(fun, op, wrap, False))
+        setattr(cls, "__r%s__" % name, _binaryMethod(fun, op, wrap, True))
+
+
+def _binaryMethod(fun, op, wrap, reflected):
+    def method(self, other):
+        return self._do_bin_op(other, fun, op, wrap, reflected)
+
+    return method
@@ -0,0 +1,119 @@
+# Copyright: see copyright.txt
+
+import weakref
+
+SymbolicType = None  # set by symbolic_type.py, which imports this module
+
+
+class Term(list):
+    """A node [op, arg, ...] of a symbolic expression. Terms are immutable and hash-consed: Term.make returns the
+    existing node for the same operator and arguments, so structurally equal expressions are the same object and
+    compare and hash in O(1). Arguments are Terms, variables (SymbolicType) or constants.
+
+    A variable argument is replaced by the leaf interned for its type and name, which holds no concrete value of
+    any execution (only the neutral value of its type, e.g. 0), so that shared nodes never show the inputs of the
+    execution that first built them.
+
+    Every node caches, from its arguments, its structural key (see SymbolicType.structuralKey), the names of its free
+    variables and its size in nodes. Terms stay lists, so the code walking expressions as [op, arg, ...] works
+    unchanged."""
+
+    __slots__ = ("key", "variables", "size", "interned", "__weakref__")
+
+    _interned = weakref.WeakValueDictionary()  # {(op, argument identities): Term}
+    _leaves = {}  # {structural key of a variable: its leaf}
+
+    @staticmethod
+    def make(op, args):
+        # one pass over the arguments for both the identity of the node and its structural key
+        arguments = []
+        identity = [op]
+        keys = [("str", op)] if isinstance(op, str) else [(type(op).__name__, op)]
+        for a in args:
+            while isinstance(a, SymbolicType) and a.expr is not None:
+                a = a.expr
+            if isinstance(a, list):
+                a = Term.of(a)
+                identity.append(a)
+                keys.append(a.key)
+            elif isinstance(a, SymbolicType):
+                key = a.structuralKey()
+                identity.append(key)
+                keys.append(key)
+                a = Term._leaf(a, key)
+            else:
+                # 1 == True, the type keeps them apart
+                key = type(a).__name__, a
+                identity.append(key)
+                keys.append(key)
+            arguments.append(a)
+        identity = tuple(identity)
+        try:
+            term = Term._interned.get(identity)
+        except TypeError:
+            # unhashable constants, the node is not shared
+            identity, term = None, None
+        if term is None:
+            term = Term._new(op, arguments, tuple(keys))
+            term.interned = identity is not None
+            if term.interned:
+                Term._interned[identity] = term
+        return term
+
+    @staticmethod
+    def of(expr):
+        """The Term of an expression given as nested lists."""
+        if isinstance(expr, Term) or not isinstance(expr, list):
+            return expr
+        return Term.make(expr[0], expr[1:])
+
+    @staticmethod
+    def _leaf(variable, key):
+        leaf = Term._leaves.get(key)
+        if leaf is None:
+            leaf = type(variable)(variable.name, type(variable.getConcrValue())())
+            Term._leaves[key] = leaf
+        return leaf
+
+    @staticmethod
+    def _new(op, args, key):
+        term = Term()
+        list.append(term, op)
+        list.extend(term, args)
+        variables = frozenset()
+        size = 1
+        for a in args:
+            if isinstance(a, Term):
+                if not a.variables <= variables:
+                    variables = a.variables if len(variables) == 0 else variables | a.variables
+                size += a.size
+            else:
+                if isinstance(a, SymbolicType) and a.name not in variables:
+                    variables = variables | {a.name}
+                size += 1
+        term.key = key
+        term.variables = variables
+        term.size = size
+        return term
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Term) or self.interned and other.interned:
+            return False
+        return self.key == other.key
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return id(self) if self.interned else hash(repr(self.key))
+
+    def __reduce__(self):
+        return Term.make, (self[0], self[1:])
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("Terms are immutable")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = pop = remove = clear = sort = reverse = _immutable
@@ -0,0 +1,90 @@
+# Copyright: see copyright.txt
+
+import logging
+from collections import deque
+
+from .hardness import predicateTerm
+from .symbolic_types.term import Term
+
+log = logging.getLogger("se.timeouts")
+
+
+class TimeoutLadder:
+    """Picks the solve timeouts of a constraint among the rungs of the ladder. Without adaptation a constraint
+    starts at the first rung and climbs one rung per UNKNOWN answer.
+
+    Adaptive ladders learn how long the queries of a branch site, or else of the same query shape (path length, size
+    of the predicate and kinds of operators on the path), take to solve. A query that timed out counts as taking the next rung. A constraint
+    starts at the rung that covers most of the learned solve times, and after an UNKNOWN it moves to the rung that
+    covers the queries that were harder than the timeout that failed."""
+
+    MIN_SAMPLES = 3
+    SAMPLES = 50  # recent solve times kept per site and shape
+    START_QUANTILE = 0.9
+    MARGIN = 1.5
+
+    def __init__(self, timeouts, adaptive=False):
+        self.timeouts = timeouts
+        self.adaptive = adaptive
+        self.site_times = {}  # {branch_id: deque of solve times}
+        self.shape_times = {}  # {shape: deque of solve times}
+
+    def start(self, constraint):
+        samples = self._samples(constraint)
+        if samples is None:
+            return self.timeouts[0]
+        return self._rung(self._quantile(samples, TimeoutLadder.START_QUANTILE) * TimeoutLadder.MARGIN)
+
+    def next(self, constraint, timeout):
+        """The timeout to try after an UNKNOWN answer at timeout, None when the ladder is exhausted."""
+        higher = [t for t in self.timeouts if t > timeout]
+        if len(higher) == 0:
+            return None
+        samples = self._samples(constraint)
+        harder = [time for time in samples if time > timeout] if samples is not None else []
+        if len(harder) == 0:
+            return higher[0]
+        return max(higher[0], self._rung(self._quantile(harder, 0.5) * TimeoutLadder.MARGIN))
+
+    def observe(self, constraint, timeout, result, solving_time):
+        if not self.adaptive:
+            return
+        if result in ("SAT", "UNSAT"):
+            time = solving_time
+        else:
+            higher = [t for t in self.timeouts if t > timeout]
+            time = higher[0] if len(higher) > 0 else timeout * 2
+        self.site_times.setdefault(constraint.branch_id, deque(maxlen=TimeoutLadder.SAMPLES)).append(time)
+        self.shape_times.setdefault(self._shape(constraint), deque(maxlen=TimeoutLadder.SAMPLES)).append(time)
+
+    def _samples(self, constraint):
+        if not self.adaptive:
+            return None
+        samples = self.site_times.get(constraint.branch_id)
+        if samples is None or len(samples) < TimeoutLadder.MIN_SAMPLES:
+            samples = self.shape_times.get(self._shape(constraint))
+        if samples is None or len(samples) < TimeoutLadder.MIN_SAMPLES:
+            return None
+        return samples
+
+    def _rung(self, time):
+        """The lowest rung that is at least time, the last rung if none is."""
+        for timeout in self.timeouts:
+            if timeout >= time:
+                return timeout
+        return self.timeouts[-1]
+
+    @staticmethod
+    def _quantile(samples, q):
+        ordered = sorted(samples)
+        return ordered[int(q * (len(ordered) - 1))]
+
+    @staticmethod
+    def _shape(constraint):
+        """The path length, the size and the variable count of the predicate, in powers of two, and the kinds of
+        operators on the path; all cached, so nothing is walked."""
+        term = predicateTerm(constraint.predicate)
+        size, variables = (term.size, len(term.variables)) if isinstance(term, Term) else (1, 0)
+        features = constraint.features
+        return constraint.getLength().bit_length(), size.bit_length(), variables.bit_length(), \
+            features.nonlinear > 0, features.strings > 0, features.bitwise > 0
@@ -0,0 +1,194 @@
+# Copyright: see copyright.txt
+
+import logging
+import threading
+from abc import ABC, abstractmethod
+from multiprocessing import Pipe, Process
+
+log = logging.getLogger("se.workers")
+
+
+class Worker(ABC):
+    """A long-lived helper process. Jobs are sent to the process over a pipe and the results come back on
+    the same pipe, so whatever the process sets up is reused across jobs. A worker that is killed
+    (preemption) is only restarted when the next job is submitted to it. Jobs are numbered; cancel sends the
+    number of the current job on a second pipe, for the process to give it up early.
+
+    Subclasses provide _serve, the loop run in the process, and _failed, the result reported for a job
+    whose process died."""
+
+    def __init__(self, worker_id, *context):
+        self.worker_id = worker_id
+        self.context = context  # extra arguments of _serve
+        self.process = None
+        self.connection = None
+        self.cancel_connection = None
+        self.job = None  # what the engine is waiting for, None when idle
+        self.sequence = 0  # number of the last job submitted
+
+    def start(self):
+        self.connection, child_connection = Pipe()
+        self.cancel_connection, child_cancel_connection = Pipe()
+        self.process = Process(target=self.__class__._serve,
+                               args=(child_connection, child_cancel_connection) + self.context)
+        self.process.daemon = True
+        self.process.start()
+        child_connection.close()
+        child_cancel_connection.close()
+        log.debug("Started {} {} (pid {})".format(self.__class__.__name__, self.worker_id, self.process.pid))
+
+    def isRunning(self):
+        return self.process is not None
+
+    def isBusy(self):
+        return self.job is not None
+
+    def submit(self, job, *args):
+        if not self.isRunning():
+            self.start()
+        self.job = job
+        self.sequence += 1
+        self.connection.send((self.sequence,) + args)
+
+    def cancel(self):
+        """Asks the process to give up the current job. The process stays alive and still reports a result for
+        the job, which the caller is expected to drop."""
+        if self.isBusy() and self.isRunning():
+            try:
+                self.cancel_connection.send(self.sequence)
+            except OSError:
+                pass
+
+    def waitables(self):
+        """The objects to pass to multiprocessing.connection.wait to learn that the current job finished."""
+        return [self.connection, self.process.sentinel]
+
+    def poll(self):
+        """Returns the result of the current job if it is available, None otherwise."""
+        if not self.isBusy():
+            return None
+        try:
+            if self.connection.poll():
+                result = self.connection.recv()
+                self.job = None
+                return result
+        except (EOFError, OSError):
+            pass
+        if self.process.is_alive():
+            return None
+        log.warning("{} {} died".format(self.__class__.__name__, self.worker_id))
+        result = self._failed(self.job)
+        self.kill()
+        return result
+
+    def kill(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.connection.close()
+            self.cancel_connection.close()
+        self.process = None
+        self.connection = None
+        self.cancel_connection = None
+        self.job = None
+
+    def stop(self):
+        if self.isRunning() and not self.isBusy():
+            try:
+                self.connection.send(None)
+                self.process.join(1)
+            except OSError:
+                pass
+        self.kill()
+
+    @abstractmethod
+    def _failed(self, job):
+        """The result reported for the job when the process died while working on it."""
+
+    @staticmethod
+    @abstractmethod
+    def _serve(connection, cancel_connection, *context):
+        """The loop run in the process: receives the jobs on connection and sends back their results, until it
+        receives None or the pipe is closed."""
+
+
+class SolverWorker(Worker):
+    """Solves queries; the solver instances are kept between queries. A worker that died while solving
+    reports its query as CRASH, which is not retried: the same query would kill the next process as well,
+    e.g. when the translation of an expression exits. A cancelled query is interrupted in the solver (see interrupt() of the solver
+    wrappers) by a thread of the process listening for cancellations."""
+
+    def __init__(self, worker_id, solve, query_store=None, incremental=False, unsat_cores=False):
+        Worker.__init__(self, worker_id, solve, query_store, incremental, unsat_cores)
+
+    def _failed(self, job):
+        timeout, constraint, solver_type = job
+        return constraint.id, timeout, "CRASH", None, 0, solver_type, None
+
+    @staticmethod
+    def _serve(connection, cancel_connection, solve, query_store, incremental, unsat_cores):
+        solvers = {}  # {solver_type: solver instance}, reused across queries
+        current = [None, None]  # number and solver type of the job being solved
+        lock = threading.Lock()  # a cancellation checks and interrupts the job before the next one starts
+        threading.Thread(target=SolverWorker._listen, args=(cancel_connection, solvers, current, lock),
+                         daemon=True).start()
+        while True:
+            try:
+                job = connection.recv()
+            except EOFError:
+                return
+            if job is None:
+                return
+            sequence, solver_type, selected_id, selected_timeout, asserts, query = job
+            with lock:
+                for solver in solvers.values():
+                    solver.interrupted = False
+                current[:] = sequence, solver_type
+            result, model, solving_time, core = solve(solvers, solver_type, asserts, query, selected_timeout,
+                                                      query_store, incremental, unsat_cores)
+            with lock:
+                current[0] = None
+            connection.send((selected_id, selected_timeout, result, model, solving_time, solver_type, core))
+
+    @staticmethod
+    def _listen(cancel_connection, solvers, current, lock):
+        while True:
+            try:
+                sequence = cancel_connection.recv()
+            except (EOFError, OSError):
+                return
+            with lock:
+                solver = solvers.get(current[1])
+                if sequence == current[0] and hasattr(solver, "interrupt"):
+                    solver.interrupt()
+
+
+class ExecutorWorker(Worker):
+    """Runs the function under test on solved models. A worker that died while executing reports an
+    execution that took no branch and raised an exception."""
+
+    def __init__(self, worker_id, execute, invocation):
+        Worker.__init__(self, worker_id, execute, invocation)
+
+    def _failed(self, job):
+        constraint, inputs, solving_time = job
+        return constraint.id, [], {}, Exception("Executor {} died".format(self.worker_id))
+
+    @staticmethod
+    def _serve(connection, cancel_connection, execute, invocation):
+        while True:
+            try:
+                job = connection.recv()
+            except EOFError:
+                return
+            if job is None:
+                return
+            sequence, selected_id, inputs = job
+            result = execute(invocation, selected_id, inputs)
+            try:
+                connection.send(result)
+            except Exception as e:
+                # the return value of the function under test may not be picklable
+                selected_id, trace, coverage, ret = result
+                log.debug("Could not send execution result: {}".format(e))
+                connection.send((selected_id, trace, coverage, repr(ret)))
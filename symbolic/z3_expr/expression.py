@@ -2,17 +2,28 @@ import utils
 
 from symbolic.symbolic_types.symbolic_int import SymbolicInteger
 from symbolic.symbolic_types.symbolic_type import SymbolicType
+from symbolic.symbolic_types.term import Term
 from z3 import *
 
+MAX_TRANSLATED_TERMS = 100000
+
 
 class Z3Expression(object):
     def __init__(self):
         self.z3_vars = {}
+        self.z3_terms = {}  # {Term: translation}, a shared subterm is translated once
 
-    def toZ3(self, solver, asserts, query):
+    def toZ3(self, solver, asserts, query, trackers=None):
+        """trackers, one Bool per assert and a last one for the query, name the assertions in unsat cores."""
         self.z3_vars = {}
-        solver.assert_exprs([self.predToZ3(p, solver) for p in asserts])
-        solver.assert_exprs(Not(self.predToZ3(query, solver)))
+        self.z3_terms = {}
+        if trackers is None:
+            solver.assert_exprs([self.predToZ3(p, solver) for p in asserts])
+            solver.assert_exprs(Not(self.predToZ3(query, solver)))
+        else:
+            for p, tracker in zip(asserts, trackers):
+                solver.assert_and_track(self.predToZ3(p, solver), tracker)
+            solver.assert_and_track(Not(self.predToZ3(query, solver)), trackers[-1])
 
     def predToZ3(self, pred, solver, env=None):
         sym_expr = self._astToZ3Expr(pred.symtype, solver, env)
@@ -26,8 +37,8 @@ class Z3Expression(object):
                 sym_expr = not sym_expr
         return sym_expr
 
-    def getIntVars(self):
-        return [v[1] for v in self.z3_vars.items() if self._isIntVar(v[1])]
+    def getIntVars(self, names=None):
+        return [v[1] for v in self.z3_vars.items() if self._isIntVar(v[1]) and (names is None or v[0] in names)]
 
     # ----------- private ---------------
 
@@ -53,6 +64,18 @@ class Z3Expression(object):
 
     # add concrete evaluation to this, to check
     def _astToZ3Expr(self, expr, solver, env=None):
+        if env is None and isinstance(expr, Term) and expr.interned:
+            translation = self.z3_terms.get(expr)
+            if translation is None:
+                if len(self.z3_terms) >= MAX_TRANSLATED_TERMS:
+                    # the sessions translate every query with the same variables
+                    self.z3_terms = {}
+                translation = self._termToZ3Expr(expr, solver, env)
+                self.z3_terms[expr] = translation
+            return translation
+        return self._termToZ3Expr(expr, solver, env)
+
+    def _termToZ3Expr(self, expr, solver, env):
         if isinstance(expr, list):
             op = expr[0]
             args = [self._astToZ3Expr(a, solver, env) for a in expr[1:]]
@@ -70,6 +93,18 @@ class Z3Expression(object):
             elif op == "%":
                 return self._mod(z3_l, z3_r, solver)
 
+            # merged states (see state_merging.py)
+            elif op == "ite":
+                if env is None:
+                    return If(z3_l != self._constant(0, solver), z3_r, args[2])
+                else:
+                    return z3_r if z3_l else args[2]
+            elif op == "and":
+                if env is None:
+                    return self._wrapIf(And(*[a != self._constant(0, solver) for a in args]), solver, env)
+                else:
+                    return all(args)
+
             # bitwise
             elif op == "<<":
                 return self._lsh(z3_l, z3_r, solver)
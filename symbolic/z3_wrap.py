@@ -6,6 +6,8 @@ import logging
 from z3 import *
 from .z3_expr.integer import Z3Integer
 from .z3_expr.bitvector import Z3BitVector
+from .predicate import Predicate
+from .solver_session import SolverSession
 
 log = logging.getLogger("se.z3")
 
@@ -17,17 +19,51 @@ class Z3Wrapper(object):
         self.query = None
         self.use_lia = True
         self.z3_expr = None
+        self.model = None
+        self.solver = None
+        self.variables = None  # names of the variables of the current query
+        # keep the path predicates asserted across queries, see SolverSession
+        self.incremental = False
+        self.sessions = {}  # {encoding: (Solver, Z3Expression, SolverSession)}
+        # name the asserts and the negated query in the solver to read unsat cores
+        self.produce_cores = False
+        # the asserts and negated query that made the last query UNSAT
+        self.unsat_core = None
+        # set by interrupt() from another thread, cleared by the caller before the next query
+        self.interrupted = False
+
+    def interrupt(self):
+        """Stops the current query, which then returns UNKNOWN. Called from another thread of the process. Only the
+        running check is interrupted: an interrupt of the context outside a check would cancel the next push."""
+        self.interrupted = True
+        solver = self.solver
+        if solver is None:
+            return
+        if hasattr(solver, "interrupt"):
+            solver.interrupt()
+        else:
+            main_ctx().interrupt()
 
     def findCounterexample(self, asserts, query, timeout=None):
         """Tries to find a counterexample to the query while
            asserts remains valid."""
-        # The current wrapper for Z3 ignores solve timeouts
         starttime = time.process_time()
-        self.solver = Solver()
-        self.solver.set(timeout=int(timeout * 1000))
         self.query = query
         self.asserts = asserts
-        res, model = self._findModel()
+        self.variables = set(query.getVars()).union(*[a.getVars() for a in asserts])
+        self.unsat_core = None
+        try:
+            if self.incremental:
+                res, model = self._findModelIncremental(timeout)
+            else:
+                self.solver = Solver()
+                self.solver.set(timeout=int(timeout * 1000))
+                res, model = self._findModel()
+        except Z3Exception:
+            # an interrupt between two checks cancels the operation in progress
+            if not self.interrupted:
+                raise
+            res, model = "UNKNOWN", None
         endtime = time.process_time()
         solvertime = endtime - starttime
         log.debug("Timeout -- %s" % timeout)
@@ -38,18 +74,25 @@ class Z3Wrapper(object):
 
     # private
 
+    def _check(self):
+        return unknown if self.interrupted else self.solver.check()
+
     def _findModel(self):
         # Try QF_LIA first (as it may fairly easily recognize unsat instances)
         model = None
         if self.use_lia:
             self.solver.push()
             self.z3_expr = Z3Integer()
-            self.z3_expr.toZ3(self.solver,self.asserts,self.query)
-            res = self.solver.check()
+            self.z3_expr.toZ3(self.solver, self.asserts, self.query, self._trackers())
+            res = self._check()
             #print(self.solver.assertions)
+            if res == unsat:
+                self.unsat_core = self._unsatCore()
             self.solver.pop()
             if res == unsat:
                 return "UNSAT", model
+            if self.interrupted:
+                return "UNKNOWN", model
 
         # now, go for SAT with bounds
         self.N = 32
@@ -81,25 +124,109 @@ class Z3Wrapper(object):
             self.solver.pop()
         return res, model
 
+    def _findModelIncremental(self, timeout):
+        """_findModel on the sessions of the wrapper: the LIA pre-check and 32 bit vectors. Models that overflow
+        32 bits are searched from scratch with wider bit vectors."""
+        if self.use_lia:
+            self._useSession("lia", timeout)
+            self.solver.push()
+            self._assertQuery()
+            res = self._check()
+            if res == unsat:
+                self.unsat_core = self._unsatCore()
+            self.solver.pop()
+            if res == unsat:
+                return "UNSAT", None
+            if self.interrupted:
+                return "UNKNOWN", None
+
+        self.N = 32
+        self.bound = (1 << 4) - 1
+        self._useSession("bv", timeout)
+        self.solver.push()
+        self._assertQuery()
+        self.model = None
+        ret, mismatch = self._boundIntegersAndCheck()
+        self.solver.pop()
+        if mismatch:
+            self.solver = Solver()
+            self.solver.set(timeout=int(timeout * 1000))
+            return self._findModel()
+        if ret == unsat:
+            return "UNSAT", None
+        elif ret == sat:
+            return "SAT", self.model
+        return "UNKNOWN", None
+
+    def _useSession(self, encoding, timeout):
+        if encoding not in self.sessions:
+            solver = Solver()
+            z3_expr = Z3Integer() if encoding == "lia" else Z3BitVector(32)
+            if self.produce_cores:
+                assert_predicate = lambda p, level: solver.assert_and_track(
+                    z3_expr.predToZ3(p, solver), Bool("path_{}".format(level), solver.ctx))
+            else:
+                assert_predicate = lambda p, level: solver.add(z3_expr.predToZ3(p, solver))
+            session = SolverSession(solver.push, solver.pop, assert_predicate)
+            self.sessions[encoding] = solver, z3_expr, session
+        self.solver, self.z3_expr, session = self.sessions[encoding]
+        self.solver.set(timeout=int(timeout * 1000))
+        session.assertPrefix(self.asserts)
+
+    def _assertQuery(self):
+        negated = Not(self.z3_expr.predToZ3(self.query, self.solver))
+        if self.produce_cores:
+            self.solver.assert_and_track(negated, Bool("query", self.solver.ctx))
+        else:
+            self.solver.add(negated)
+
+    def _trackers(self):
+        if not self.produce_cores:
+            return None
+        return [Bool("assert_{}".format(i), self.solver.ctx) for i in range(len(self.asserts))] + \
+               [Bool("query", self.solver.ctx)]
+
+    def _unsatCore(self):
+        """Maps the trackers in the unsat core of the solver back to the asserts and the negated query. Session
+        levels count the asserts from the root."""
+        if not self.produce_cores:
+            return None
+        core = []
+        for tracker in self.solver.unsat_core():
+            name = str(tracker)
+            if name == "query":
+                core.append(Predicate(self.query.symtype, not self.query.result))
+            elif name.startswith("assert_"):
+                core.append(self.asserts[int(name[len("assert_"):])])
+            elif name.startswith("path_"):
+                core.append(self.asserts[len(self.asserts) - 1 - int(name[len("path_"):])])
+        return core if len(core) > 0 else None
+
     def _setAssertsQuery(self):
         self.z3_expr = Z3BitVector(self.N)
-        self.z3_expr.toZ3(self.solver, self.asserts, self.query)
+        self.z3_expr.toZ3(self.solver, self.asserts, self.query, self._trackers())
 
     def _findModel2(self):
         self._setAssertsQuery()
-        int_vars = self.z3_expr.getIntVars()
+        return self._boundIntegersAndCheck()
+
+    def _boundIntegersAndCheck(self):
+        int_vars = self.z3_expr.getIntVars(self.variables)
         res = unsat
         while res == unsat and self.bound <= (1 << (self.N - 1)) - 1:
             self.solver.push()
             constraints = self._boundIntegers(int_vars, self.bound)
             self.solver.assert_exprs(constraints)
-            res = self.solver.check()
+            res = self._check()
             if res == unsat:
+                # no unsat core: the bounds are not tracked and the bit vectors wrap around, so a core of the
+                # predicates alone could be satisfiable over the integers
                 self.bound = (self.bound << 1) + 1
                 self.solver.pop()
         if res == sat:
             # Does concolic agree with Z3? If not, it may be due to overflow
             model = self._getModel()
+            self.model = model
             # print("Match?")
             # print(self.solver.assertions)
             self.solver.pop()
@@ -121,6 +248,8 @@ class Z3Wrapper(object):
         res = {}
         model = self.solver.model()
         for name in self.z3_expr.z3_vars.keys():
+            if name not in self.variables:
+                continue
             try:
                 ce = model.eval(self.z3_expr.z3_vars[name])
                 res[name] = ce.as_signed_long()
@@ -41,14 +41,15 @@ class Z3Str2Wrapper(object):
         else:
             self.query_store = query_store
         self.solvertime = 0
+        self.options = dict(Z3Str2Wrapper.options)  # per instance, tuned portfolio entries change them
 
     def findCounterexample(self, asserts, query, timeout=10**10):
         starttime = time.process_time()
-        Z3Str2Wrapper.options['tlimit-per'] = timeout * 1000
+        self.options['tlimit-per'] = timeout * 1000
         self.solvetimeout = timeout
         self.em = ExprManager()
         self.solver = SmtEngine(self.em)
-        for name, value in Z3Str2Wrapper.options.items():
+        for name, value in self.options.items():
             self.solver.setOption(name, SExpr(str(value)))
         self.solver.setLogic(Z3Str2Wrapper.logic)
         self.query = query
@@ -125,20 +126,3 @@ class Z3Str2Wrapper(object):
         elif len(smtlib) > 1:
             return [smtlib[0]] + [self._transform(subsmtlib) for subsmtlib in smtlib[1:]]
         return smtlib
-
-
-    @staticmethod
-    def _coneOfInfluence(asserts, query):
-        cone = []
-        cone_vars = set(query.getVars())
-        ws = [a for a in asserts if len(set(a.getVars()) & cone_vars) > 0]
-        remaining = [a for a in asserts if a not in ws]
-        while len(ws) > 0:
-            a = ws.pop()
-            a_vars = set(a.getVars())
-            cone_vars = cone_vars.union(a_vars)
-            cone.append(a)
-            new_ws = [a for a in remaining if len(set(a.getVars()) & cone_vars) > 0]
-            remaining = [a for a in remaining if a not in new_ws]
-            ws = ws + new_ws
-        return cone
\ No newline at end of file
@@ -0,0 +1,18 @@
+# With --adaptive-timeouts, the queries of the branch in the loop pick their timeouts from the solve times of the
+# earlier queries of the same site and shape.
+
+def adaptive_timeouts(a, b):
+    r = 0
+    for i in range(3):
+        if a * i == b + i:
+            r += 1
+    return r
+
+
+def expected_result_set():
+    # a == b + 1 and 2 * a == b + 2 only hold together with b == 0
+    return [0, 1, 3]
+
+
+def expected_merged_result_set():
+    return [1]
@@ -0,0 +1,20 @@
+# Predicates of the same shape over different variables (a > 3, b > 3): the solver cache must number the
+# variables of their queries the same way in every run, whatever the hash seed.
+
+def cache_independent(a, b, c):
+    r = 0
+    if a > 3:
+        r += 1
+    if b > 3:
+        r += 2
+    if a + b + c > 3 and c < a + b:
+        r += 4
+    return r
+
+
+def expected_result_set():
+    return [0, 1, 2, 3, 4, 5, 6, 7]
+
+
+def expected_merged_result_set():
+    return [0, 6]
@@ -10,3 +10,6 @@ def diamond(x,y,z):
 
 def expected_result_set():
     return [ 0, 1, 1, 1, 2, 2, 2, 3]
+
+def expected_merged_result_set():
+    return [0]
@@ -14,3 +14,6 @@ def expressions(in1, in2):
 
 def expected_result():
 	return [-1,0]
+
+def expected_merged_result():
+	return [0]
@@ -0,0 +1,29 @@
+# The checks on a make a deep path next to the shallow branch on b. With --frontier-order breadth_first or
+# shortest_first the shallow constraints are solved first, with random_path mostly; every path is still explored.
+
+def frontier_order(a, b):
+    if b == 9:
+        return -1
+    r = 0
+    if a > 0:
+        if a > 10:
+            if a > 100:
+                r = 3
+            else:
+                r = 2
+        else:
+            r = 1
+    return r
+
+
+def expected_result_set():
+    return [-1, 0, 1, 2, 3]
+
+
+def expected_merged_result_set():
+    return [-1, 0, 1, 2]
+
+
+def expected_first_results():
+    # depth-first search returns -1 last
+    return {"breadth_first": [0, 1, -1], "shortest_first": [0, -1, 1]}
@@ -0,0 +1,26 @@
+# With --function-summaries, the paths of clamp are recorded in the first caller path and reused in the others
+# instead of exploring clamp again.
+
+def clamp(v, low, high):
+    if v < low:
+        return low
+    if v > high:
+        return high
+    return v
+
+
+def function_summary(a, b):
+    r = 0
+    if b > 0:
+        r += 1
+    if clamp(a, 0, 10) == 10:
+        r += 2
+    return r
+
+
+def expected_result_set():
+    return [0, 1, 2, 3]
+
+
+def expected_merged_result_set():
+    return [0, 2]
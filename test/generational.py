@@ -0,0 +1,20 @@
+# With --search-strategy generational, the constraints of the execution that covered the most new code are solved
+# first; every path is still explored.
+
+def generational(a, b):
+    r = 0
+    if a == 7:
+        r += 1
+        if b == 3:
+            r += 2
+    if b > 10:
+        r += 4
+    return r
+
+
+def expected_result_set():
+    return [0, 1, 3, 4, 5]
+
+
+def expected_merged_result_set():
+    return [0, 1]
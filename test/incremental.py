@@ -0,0 +1,27 @@
+# With --incremental, consecutive queries share the path prefix kept asserted in the solver, which pops back to
+# the common prefix when the next query is on another branch.
+
+def incremental(a, b, c):
+    r = 0
+    if a > 0:
+        r += 1
+    if b > a:
+        r += 2
+    if c > b:
+        r += 4
+    if c == a + b:
+        r += 8
+    return r
+
+
+def expected_result_set():
+    # c == a + b contradicts c > b when a <= 0 and c <= b when a > 0
+    return [0, 1, 2, 3, 4, 5, 6, 7, 8, 10, 13, 15]
+
+
+def expected_merged_result_set():
+    return [8]
+
+
+def expected_counters():
+    return {"shared_prefixes": 1}
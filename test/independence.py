@@ -0,0 +1,19 @@
+# The query on c is independent of the branches on a and b, so it is solved alone; its model must keep the values
+# of a and b from the current inputs to reach return 3.
+
+def independence(a, b, c):
+    if a > 3:
+        if b == a + 1:
+            if c > 100:
+                return 3
+            return 2
+        return 1
+    return 0
+
+
+def expected_result_set():
+    return [0, 1, 2, 3]
+
+
+def expected_counters():
+    return {"sliced_queries": 1}
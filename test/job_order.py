@@ -0,0 +1,28 @@
+# Unit check of the ordering of shortest_job_first: once the hardness model has seen nonlinear queries take longer
+# than linear ones, the frontier gives the linear constraint first, although the depth-first order of the
+# constraints it ranks the same would give the deeper nonlinear one first. The function runs once, on concrete
+# arguments.
+from types import SimpleNamespace
+
+from symbolic.args import concrete
+from symbolic.frontier import Frontier
+from symbolic.hardness import HardnessModel, QueryFeatures
+from symbolic.search_strategies import shortest_job_first
+
+
+@concrete(observations=HardnessModel.MIN_OBSERVATIONS)
+def job_order(observations):
+    linear = QueryFeatures(2, 6, 0, 0, 0, frozenset(["a"]))
+    nonlinear = QueryFeatures(3, 9, 1, 0, 0, frozenset(["b", "c"]))
+    exploration = SimpleNamespace(hardness=HardnessModel())
+    for _ in range(observations):
+        exploration.hardness.observe(linear, 1.0, "SAT", 0.001)
+        exploration.hardness.observe(nonlinear, 1.0, "SAT", 0.5)
+    frontier = Frontier(shortest_job_first, exploration)
+    frontier.put(1.0, SimpleNamespace(id=1, depth=2, features=linear))
+    frontier.put(1.0, SimpleNamespace(id=2, depth=3, features=nonlinear))
+    return tuple(frontier.select(lambda timeout, constraint: True)[1].id for _ in range(2))
+
+
+def expected_result():
+    return [(1, 2)]
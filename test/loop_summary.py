@@ -0,0 +1,18 @@
+# The loop runs n times. Without --loop-summaries, n == 3 is only feasible on the path that unrolls the loop three
+# times; with it, the query after the loop is solved with a symbolic trip count on the paths of fewer iterations.
+
+def loop_summary(n):
+    i = 0
+    while i < n:
+        i += 1
+    if n == 3:
+        return 2
+    return min(i, 1)
+
+
+def expected_result_set():
+    return [0, 1, 2]
+
+
+def expected_counters():
+    return {"summarized_queries": 1}
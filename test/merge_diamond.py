@@ -0,0 +1,26 @@
+# With --merge-states, the two ifs on r are merged into ite expressions that the later ifs branch on. The ifs on v
+# are merged too, but the second would compute v + 1 on the string when y <= 0, so it runs unmerged then.
+
+
+def merge_diamond(x, y):
+    r = 0
+    if x > 0:
+        r = r + 1
+    if y > 0:
+        r = r + 2
+    v = "none"
+    if y > 0:
+        v = 1
+    if y > 0:
+        v = v + 1
+    if r == 3:
+        return 3
+    if r == 2:
+        return 2
+    if r == 1:
+        return 1
+    return 0
+
+
+def expected_result_set():
+    return [0, 1, 2, 3]
@@ -0,0 +1,19 @@
+# The inputs found for b == 1 on one side of the branch on a also satisfy b > 0 on the other side, a different
+# query, so model reuse answers it by evaluating it on them, without a solver (unless --model-reuse 0).
+
+def model_reuse(a, b):
+    if a > 0:
+        if b > 0:
+            return 1
+        return 2
+    if b == 1:
+        return 3
+    return 4
+
+
+def expected_result_set():
+    return [1, 2, 3, 4]
+
+
+def expected_counters():
+    return {"reused_models": 1}
@@ -0,0 +1,31 @@
+# With --search-strategy coverage_novelty, the branches from which more uncovered code is reachable are solved
+# first: the check on b == 1, which leads to every other check, before the deeper check on a that depth-first
+# search solves first. (The file name must not contain "coverage", which marks the files of the instrumentation.)
+
+def novelty(a, b):
+    r = 0
+    if b == 1:
+        r += 1
+    if b == 2:
+        r += 2
+    if a != 5:
+        return r
+    else:
+        r += 10
+        if b > 1:
+            r += 20
+        else:
+            r += 40
+    return r
+
+
+def expected_result_set():
+    return [0, 1, 2, 30, 32, 50, 51]
+
+
+def expected_merged_result_set():
+    return [0, 50]
+
+
+def expected_first_results():
+    return {"coverage_novelty": [0, 1]}
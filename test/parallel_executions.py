@@ -0,0 +1,15 @@
+# With -e, the executions run in executor processes and their return values come back pickled; they must compare
+# equal to the values of executions in the engine process.
+
+def parallel_executions(a, b):
+    if a > b:
+        if a - b > 10:
+            return "far", 2
+        return "near", 1
+    if a == b:
+        return "equal", 0
+    return None
+
+
+def expected_result_set():
+    return [("far", 2), ("near", 1), ("equal", 0), None]
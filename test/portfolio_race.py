@@ -0,0 +1,16 @@
+# With --portfolio z3 --portfolio z3:use_lia=false, every query races two Z3 configurations: the first decisive
+# answer is used and the other solver is interrupted. The product needs the bit vector encoding, the unreachable
+# branch an UNSAT answer.
+
+def portfolio_race(x, y):
+    if x * x == 49 and x > 0:
+        if y > x and y < x:
+            return -1
+        return 1
+    if x + y == 20 and x - y == 4:
+        return 2
+    return 0
+
+
+def expected_result_set():
+    return [0, 1, 2]
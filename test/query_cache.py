@@ -0,0 +1,24 @@
+# The check on a is repeated. The asserts of a query are a set, so negating the second and the third check builds
+# the same query on each path, and the query cache answers it the second time without a solver.
+
+def query_cache(a):
+    r = 0
+    if a > 3:
+        r += 1
+    if a > 3:
+        r += 2
+    if a > 3:
+        r += 4
+    return r
+
+
+def expected_result_set():
+    return [0, 7]
+
+
+def expected_merged_result_set():
+    return [0]
+
+
+def expected_counters():
+    return {"query_cache.hits": 1}
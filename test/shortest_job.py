@@ -0,0 +1,20 @@
+# With -p shortest_job_first (or --search-strategy shortest_job_first), the linear queries on a are predicted
+# to be faster than the nonlinear ones on b and c and are solved first (job_order.py checks this ordering).
+
+def shortest_job(a, b, c):
+    r = 0
+    if a > 3:
+        r += 1
+    if b * c == 42 and b > c > 1:
+        r += 2
+    if a < -3:
+        r += 4
+    return r
+
+
+def expected_result_set():
+    return [0, 1, 2, 3, 4, 6]
+
+
+def expected_merged_result_set():
+    return [0, 2]
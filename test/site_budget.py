@@ -0,0 +1,14 @@
+# Every iteration of the loop adds a constraint at the same branch site. With --max-site-constraints or
+# --max-unroll the loop is unrolled only a few times, while the branch on b after it still gets its own budget.
+
+def site_budget(a, b):
+    i = 0
+    while i < a:
+        i += 1
+    if b == 5:
+        return 2
+    return min(i, 1)
+
+
+def expected_result_set():
+    return [0, 1, 2]
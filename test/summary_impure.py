@@ -0,0 +1,38 @@
+# With --function-summaries, only index_free is summarized: index reads a table at the concrete value of its
+# argument and remember appends to a global, so a summary of either would return stale values or skip the append.
+
+table = [5, 7, 9, 11]
+calls = []
+
+
+def index(x):
+    return table[x]
+
+
+def remember(x):
+    calls.append(x)
+    return x
+
+
+def index_free(x):
+    if x == 2:
+        return 9
+    return 5
+
+
+def summary_impure(a):
+    del calls[:]
+    if a < 0 or a > 3:
+        return -1
+    remember(a)
+    remember(a)
+    if len(calls) != 2:
+        return -2
+    v = index(a)
+    if a == 2:
+        return v + index_free(a)
+    return index_free(a)
+
+
+def expected_result_set():
+    return [-1, 5, 18]
@@ -0,0 +1,26 @@
+# The query a < 5 is asked on both paths of the branch on a > 20; the first is UNSAT with the core a > 10, a < 5,
+# which prunes the second without a solver. The solutions of the query on c are beyond the small bounds that the
+# bit vector encoding tries first, whose UNSAT answers must not be learned as cores.
+
+def unsat_core(a, c):
+    r = 0
+    if a > 10:
+        if a > 20:
+            r += 1
+        if a < 5:
+            return -1
+        if c * 1000 > 70000 and c < 80:
+            r += 2
+    return r
+
+
+def expected_result_set():
+    return [0, 1, 2, 3]
+
+
+def expected_merged_result_set():
+    return [0, 2]
+
+
+def expected_counters():
+    return {"core_hits": 1}
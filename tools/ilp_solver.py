@@ -172,17 +172,14 @@ def main():
     ## Constraints are discovered if used
     for path_constraint_id, ilp_path_constraint_var in path_constraints.items():
         if round(ilp_path_constraints[ilp_path_constraint_var].value) == 1:
-            for path_constraint in all_path_constraints(root):
-                if path_constraint.id == path_constraint_id and path_constraint.parent is not None:
-                    assert(round(ilp_path_constraints[path_constraints[path_constraint.parent.id]].value) == 1)
+            path_constraint = graph.find_constraint(path_constraint_id)
+            if path_constraint.parent is not None:
+                assert(round(ilp_path_constraints[path_constraints[path_constraint.parent.id]].value) == 1)
 
     ## If input is used in constraint, then all constraints from that input are used as well
     for path_constraint_id, ilp_path_constraint_var in path_constraints.items():
         if round(ilp_path_constraints[ilp_path_constraint_var].value) == 1:
-            path_constraint_input = None
-            for path_constraint in all_path_constraints(root):
-                if path_constraint_id == path_constraint.id:
-                    path_constraint_input = extract_model(path_constraint)
+            path_constraint_input = extract_model(graph.find_constraint(path_constraint_id))
             assert(path_constraint_input is not None or path_constraint_id == 0)
             for path_constraint in all_path_constraints(root):
                 if extract_model(path_constraint) == path_constraint_input:
@@ -0,0 +1,52 @@
+# Copyright: see copyright.txt
+#
+# Measures the cost of an operation on symbolic values against the same operation on plain values.
+#
+# To run:
+# $ python tools/op_overhead.py [-n NUMBER]
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from symbolic.symbolic_types import SymbolicInteger, SymbolicStr
+
+# (name, statement, number of operations in the statement)
+BENCHMARKS = [("int +", "x + y", 1),
+              ("int * const", "x * 3", 1),
+              ("int <", "x < y", 1),
+              ("int const +", "3 + x", 1),
+              ("int arithmetic", "(x + y) * 3 - (x % 7) // 2 < y", 6),
+              ("str +", "s + t", 1),
+              ("str len", "len(s)", 1)]
+
+
+def measure(statement, namespace, number):
+    """The best time of an execution of the statement, in seconds."""
+    return min(timeit.repeat(statement, globals=namespace, number=number, repeat=5)) / number
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Compares the per-operation overhead of symbolic integers and "
+                                                    "strings with the plain int and str operations.")
+    argparser.add_argument("-n", "--number", type=int, default=20000, help="Executions of each statement per run.")
+    args = argparser.parse_args()
+
+    plain = {"x": 12345, "y": 678, "s": "abc", "t": "def"}
+    symbolic = {"x": SymbolicInteger("x", 12345), "y": SymbolicInteger("y", 678),
+                "s": SymbolicStr("s", "abc"), "t": SymbolicStr("t", "def")}
+    symbolic["len"] = lambda v: v.__len__()
+
+    print("{:<16} {:>12} {:>14} {:>10}".format("operation", "plain ns/op", "symbolic ns/op", "overhead"))
+    for name, statement, operations in BENCHMARKS:
+        plain_time = measure(statement, plain, args.number) / operations
+        symbolic_time = measure(statement, symbolic, args.number) / operations
+        print("{:<16} {:>12.1f} {:>14.1f} {:>9.0f}x".format(name, plain_time * 1e9, symbolic_time * 1e9,
+                                                           symbolic_time / plain_time))
+
+
+if __name__ == "__main__":
+    main()